@@ -1,28 +1,54 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr, validator
-from typing import List, Optional
-import uuid
+from pydantic import BaseModel, EmailStr, field_validator, model_validator
+from typing import List, Optional, Tuple
+import functools
+import hashlib
 from datetime import datetime
 import logging
 import os
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
-import json
 from pathlib import Path
 import qrcode
+from qrcode.image.svg import SvgPathImage
 import io
 import base64
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 from urllib.parse import urlencode
+from contextlib import asynccontextmanager
+
+from mailer import MailSender
+from metrics import REGISTRY, STAGE_SECONDS, Gauge, MetricsMiddleware
+from outbox import OutboxWorker
+from store import LRUCache, SQLiteOrderRepository
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work is done here, rather than at import, so that it runs in
+    # every worker process
+    ORDERS_DIR.mkdir(exist_ok=True)
+    order_store.initialize(min_sequence=find_legacy_order_sequence())
+    get_confirmation_templates()
+    
+    if not OUTBOX_WORKER:
+        logger.info("Outbox worker disabled, emails are sent by a separate process")
+    elif SMTP_HOST == DEFAULT_SMTP_HOST and (not GMAIL_USER or not GMAIL_PASSWORD):
+        # a local SMTP server, such as the one for testing, needs no login
+        logger.error("GMAIL_USER or GMAIL_APP_PASSWORD not set in environment variables, emails will stay in the outbox")
+    else:
+        outbox_worker.start()
+    yield
+    outbox_worker.stop(timeout=SMTP_TIMEOUT)
+
 app = FastAPI(
+    lifespan=lifespan,
     title="String Art Kit Checkout API",
     description="API for processing string art kit orders with UPI payment integration",
     version="1.0.0"
@@ -37,6 +63,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record the latency of every request for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Pydantic Models for Request/Response
 class CustomerInfo(BaseModel):
     name: str
@@ -48,13 +77,15 @@ class CustomerInfo(BaseModel):
     state: str
     pinCode: str
     
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
         if not v or len(v) < 10:
             raise ValueError('Phone number must be at least 10 digits')
         return v
     
-    @validator('pinCode')
+    @field_validator('pinCode')
+    @classmethod
     def validate_pin_code(cls, v):
         if not v or len(v) < 6:
             raise ValueError('PIN code must be at least 6 digits')
@@ -66,13 +97,15 @@ class CartItem(BaseModel):
     price: float
     quantity: int
     
-    @validator('price')
+    @field_validator('price')
+    @classmethod
     def validate_price(cls, v):
         if v <= 0:
             raise ValueError('Price must be greater than 0')
         return v
     
-    @validator('quantity')
+    @field_validator('quantity')
+    @classmethod
     def validate_quantity(cls, v):
         if v <= 0:
             raise ValueError('Quantity must be greater than 0')
@@ -83,23 +116,26 @@ class CheckoutRequest(BaseModel):
     items: List[CartItem]
     totalPrice: float
     
-    @validator('items')
+    @field_validator('items')
+    @classmethod
     def validate_items(cls, v):
         if not v:
             raise ValueError('Cart cannot be empty')
         return v
     
-    @validator('totalPrice')
-    def validate_total_price(cls, v, values):
+    @field_validator('totalPrice')
+    @classmethod
+    def validate_total_price(cls, v):
         if v <= 0:
             raise ValueError('Total price must be greater than 0')
-        
-        # Validate total matches items
-        if 'items' in values:
-            calculated_total = sum(item.price * item.quantity for item in values['items'])
-            if abs(v - calculated_total) > 0.01:  # Allow small floating point differences
-                raise ValueError('Total price does not match sum of items')
         return v
+    
+    @model_validator(mode='after')
+    def validate_total_matches_items(self):
+        calculated_total = sum(item.price * item.quantity for item in self.items)
+        if abs(self.totalPrice - calculated_total) > 0.01:  # Allow small floating point differences
+            raise ValueError('Total price does not match sum of items')
+        return self
 
 class CheckoutResponse(BaseModel):
     success: bool
@@ -113,228 +149,229 @@ UPI_ID = os.getenv("UPI_ID", "stringart@upi")
 PAYEE_NAME = os.getenv("PAYEE_NAME", "StringArt")
 GMAIL_FROM_ADDRESS = os.getenv("GMAIL_FROM_ADDRESS", "orders@stringart.in")
 PAYMENT_INSTRUCTIONS_LINK = os.getenv("PAYMENT_INSTRUCTIONS_LINK", "https://stringart.in/payment-instructions")
+DEFAULT_SMTP_HOST = "smtp.gmail.com"
+SMTP_HOST = os.getenv("SMTP_HOST", DEFAULT_SMTP_HOST)
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+GMAIL_USER = os.getenv("GMAIL_USER")
+GMAIL_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
+# Set OUTBOX_WORKER=0 when the outbox is drained by a separate process
+OUTBOX_WORKER = os.getenv("OUTBOX_WORKER", "1") == "1"
 
-# Create orders directory if it doesn't exist
-ORDERS_DIR = Path("orders")
-ORDERS_DIR.mkdir(exist_ok=True)
+ORDERS_DIR = Path(os.getenv("ORDERS_DIR", "orders"))
+TEMPLATE_DIR = Path(__file__).parent / "templates"
 
-# Setup Jinja2 template environment
-TEMPLATE_DIR = Path("templates")
-template_env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+# Set EMAIL_DEBUG_DIR to save a copy of every rendered email there
+EMAIL_DEBUG_DIR = os.getenv("EMAIL_DEBUG_DIR")
 
-# In-memory storage for orders (replace with database in production)
-orders_db = {}
+# Recently rendered emails, reused when a delivery is retried
+rendered_emails = LRUCache(maxsize=128)
 
-def get_next_order_sequence() -> int:
-    """Get the next order sequence number by checking existing files"""
-    try:
-        existing_files = list(ORDERS_DIR.glob("*.json"))
-        if not existing_files:
-            return 1
-        
-        # Extract sequence numbers from filenames and find the max
-        sequence_numbers = []
-        for file_path in existing_files:
-            try:
-                sequence = int(file_path.stem)
-                sequence_numbers.append(sequence)
-            except ValueError:
-                continue
-        
-        return max(sequence_numbers) + 1 if sequence_numbers else 1
-    except Exception as e:
-        logger.error(f"Error getting next order sequence: {e}")
-        return 1
+# Orders are stored in a SQLite database shared by all the workers
+ORDERS_DB = Path(os.getenv("ORDERS_DB", ORDERS_DIR / "orders.db"))
+order_store = SQLiteOrderRepository(ORDERS_DB)
 
-def save_order_to_file(order_data: dict) -> str:
-    """Save order data to a JSON file with sequential numbering"""
-    try:
-        sequence = get_next_order_sequence()
-        filename = f"{sequence:03d}.json"  # 001.json, 002.json, etc.
-        file_path = ORDERS_DIR / filename
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(order_data, f, indent=2, ensure_ascii=False)
-        
-        logger.info(f"Order saved to file: {file_path}")
-        return filename
-    except Exception as e:
-        logger.error(f"Error saving order to file: {e}")
-        raise
+@functools.cache
+def get_confirmation_templates() -> dict:
+    """Load the templates of the confirmation email.
+
+    The templates are compiled once and the compiled bytecode is cached on
+    disk to make the cold starts faster.
+    """
+    template_env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        bytecode_cache=FileSystemBytecodeCache(),
+        auto_reload=False
+    )
+    return {
+        "html": template_env.get_template("email_order_confirmation.html"),
+        "text": template_env.get_template("email_order_confirmation.txt"),
+    }
+
+def find_legacy_order_sequence() -> int:
+    """Find the highest sequence number used by the earlier versions, which
+    kept orders as JSON files and the last sequence number in a file.
+    """
+    sequence_numbers = [0]
+    sequence_file = ORDERS_DIR / "sequence"
+    if sequence_file.exists():
+        sequence_numbers.append(int(sequence_file.read_text().strip() or 0))
+    for file_path in ORDERS_DIR.glob("*.json"):
+        try:
+            sequence_numbers.append(int(file_path.stem))
+        except ValueError:
+            continue
+    return max(sequence_numbers)
 
 def generate_order_number() -> str:
-    """Generate order number based on next sequence number"""
-    sequence = get_next_order_sequence()
+    """Generate order number from a newly allocated sequence number"""
+    sequence = order_store.next_sequence()
     return f"{sequence:03d}"  # 001, 002, etc.
 
 def create_upi_payment_link(order_number: str, amount: float) -> str:
     """Create UPI payment link with proper parameters"""
     return f"upi://pay?pa={UPI_ID}&pn={PAYEE_NAME}&am={amount}&tn={order_number}"
 
-async def send_confirmation_email(customer: CustomerInfo, order_number: str, items: List[CartItem], total_price: float):
-    """Send confirmation email to customer using Google SMTP with Jinja2 template"""
-    try:
-        # Get email credentials from environment
-        gmail_user = os.getenv("GMAIL_USER")
-        gmail_password = os.getenv("GMAIL_APP_PASSWORD")
-        
-        if not gmail_user or not gmail_password:
-            logger.error("GMAIL_USER or GMAIL_APP_PASSWORD not set in environment variables")
-            return
-        
-        # Create UPI payment link
-        payment_link = create_upi_payment_link(order_number, total_price)
-        
-        # Build payment instructions URL with query params
-        payment_instructions_url = f"{PAYMENT_INSTRUCTIONS_LINK}?" + urlencode({
-            'amount': total_price,
-            'comment': f"Order {order_number}"
-        })
-        
-        # Load and render template
-        template = template_env.get_template("email_order_confirmation.html")
-        html_content = template.render(
-            customer=customer,
-            order_number=order_number,
-            items=items,
-            total_price=total_price,
-            payment_instructions_url=payment_instructions_url,
-            upi_id=UPI_ID
-        )
-        
-        # Save HTML content to file for debugging
+def build_order_email(kind: str, order: dict) -> MIMEMultipart:
+    """Build the email of the given kind for an order from the outbox"""
+    if kind == "order_confirmation":
+        return build_confirmation_email(order)
+    raise ValueError(f"Unknown email kind: {kind}")
+
+def render_confirmation_email(order: dict) -> Tuple[str, str]:
+    """Render the HTML and the plain text versions of the confirmation email"""
+    order_number = order["orderNumber"]
+    total_price = order["totalPrice"]
+    
+    # Build payment instructions URL with query params
+    payment_instructions_url = f"{PAYMENT_INSTRUCTIONS_LINK}?" + urlencode({
+        'amount': total_price,
+        'comment': f"Order {order_number}"
+    })
+    
+    context = dict(
+        customer=order["customer"],
+        order_number=order_number,
+        items=order["items"],
+        total_price=total_price,
+        payment_link=create_upi_payment_link(order_number, total_price),
+        payment_instructions_url=payment_instructions_url,
+        upi_id=UPI_ID
+    )
+    templates = get_confirmation_templates()
+    html_content = templates["html"].render(context)
+    text_content = templates["text"].render(context)
+    
+    # Save HTML content to file for debugging
+    if EMAIL_DEBUG_DIR:
         try:
-            with open("email.html", "w", encoding="utf-8") as f:
-                f.write(html_content)
-            logger.info(f"Email HTML saved to email.html for order {order_number}")
+            path = Path(EMAIL_DEBUG_DIR) / f"{order_number}.html"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(html_content, encoding="utf-8")
+            logger.info(f"Email HTML saved to {path} for order {order_number}")
         except Exception as e:
             logger.error(f"Failed to save email HTML: {e}")
-        
-        # Create plain text content
-        text_content = f"""
-        Order Confirmation - {order_number}
-        
-        Dear {customer.name},
-        
-        Thank you for your order! Here are your order details:
-        
-        Order Number: {order_number}
-        Total Amount: ₹{total_price}
-        
-        Items:
-        {chr(10).join([f'- {item.title} x{item.quantity} = ₹{item.price * item.quantity}' for item in items])}
-        
-        Shipping Address:
-        {customer.addressLine1}
-        {customer.addressLine2 or ''}
-        {customer.city}, {customer.state} {customer.pinCode}
-        
-        Payment Instructions:
-        1. Scan the QR code in the HTML version or click the payment link
-        2. Complete the UPI payment
-        3. Reply to this email to confirm payment
-        
-        Payment Link: {payment_link}
-        
-        Best regards,
-        String Art Studio
-        """
-        
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"Order Confirmation - {order_number}"
-        msg['From'] = formataddr(("String Art Studio", GMAIL_FROM_ADDRESS))
-        msg['To'] = customer.email
-        
-        # Attach both HTML and plain text versions
-        msg.attach(MIMEText(text_content, 'plain'))
-        msg.attach(MIMEText(html_content, 'html'))
-        
-        # Send email using Google SMTP
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(gmail_user, gmail_password)
-            server.send_message(msg)
-        
-        logger.info(f"Confirmation email sent successfully to {customer.email} for order {order_number}")
-        
-    except smtplib.SMTPAuthenticationError:
-        logger.error(f"SMTP authentication failed for {gmail_user}. Check GMAIL_APP_PASSWORD.")
-    except smtplib.SMTPRecipientsRefused as e:
-        logger.error(f"Email recipient refused: {customer.email}. Error: {e}")
-    except smtplib.SMTPServerDisconnected:
-        logger.error("SMTP server disconnected unexpectedly")
-    except smtplib.SMTPException as e:
-        logger.error(f"SMTP error occurred: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error sending email to {customer.email}: {e}")
+    
+    return html_content, text_content
+
+def build_confirmation_email(order: dict) -> MIMEMultipart:
+    """Build confirmation email to customer using Jinja2 template"""
+    order_number = order["orderNumber"]
+    customer = order["customer"]
+    
+    # Retries of the same email don't need to render it again
+    rendered = rendered_emails.get(order_number)
+    if rendered is None:
+        with STAGE_SECONDS.time(stage="email_render"):
+            rendered = render_confirmation_email(order)
+        rendered_emails.put(order_number, rendered)
+    html_content, text_content = rendered
+    
+    # Create message
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f"Order Confirmation - {order_number}"
+    msg['From'] = formataddr(("String Art Studio", GMAIL_FROM_ADDRESS))
+    msg['To'] = customer['email']
+    
+    # Attach both HTML and plain text versions
+    msg.attach(MIMEText(text_content, 'plain'))
+    msg.attach(MIMEText(html_content, 'html'))
+    
+    return msg
+
+# Emails are added to the outbox along with the order and delivered by the
+# outbox worker over a shared SMTP connection
+mail_sender = MailSender(
+    SMTP_HOST,
+    SMTP_PORT,
+    GMAIL_USER,
+    GMAIL_PASSWORD,
+    use_ssl=SMTP_SSL,
+    timeout=SMTP_TIMEOUT
+)
+# Only one worker process at a time, the one holding the lock, sends emails
+outbox_worker = OutboxWorker(order_store, mail_sender, build_order_email,
+                             batch_size=SMTP_BATCH_SIZE, lock_path=ORDERS_DIR / "outbox.lock")
+
+Gauge("orders_cached", "Number of orders in the in-process order cache",
+      function=lambda: len(order_store.cache))
+Gauge("outbox_pending_messages", "Number of emails waiting in the outbox",
+      function=lambda: order_store.outbox_pending())
+
+QR_CODE_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+@functools.lru_cache(maxsize=256)
+def generate_qr_code(data: str, format: str = "png") -> bytes:
+    """Generate QR code as PNG or SVG image.
+
+    The images are cached as the same payment link is requested again
+    every time the payment page is opened.
+    """
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    buffer = io.BytesIO()
+    if format == "svg":
+        img = qr.make_image(image_factory=SvgPathImage)
+        img.save(buffer)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer, format='PNG')
+    return buffer.getvalue()
 
 def generate_qr_code_base64(data: str, size: int = 200) -> str:
     """Generate QR code and return as base64 string"""
     try:
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-        
+        img_str = base64.b64encode(generate_qr_code(data, "png")).decode()
         return f"data:image/png;base64,{img_str}"
     except Exception as e:
         logger.error(f"Error generating QR code: {e}")
         return ""
 
 @app.post("/api/checkout", response_model=CheckoutResponse)
-async def checkout(request: CheckoutRequest, background_tasks: BackgroundTasks):
+async def checkout(request: CheckoutRequest, http_request: Request):
     """
     Process checkout and create order with UPI payment information
     """
     try:
         logger.info(f"Processing checkout for customer: {request.customer.email}")
         
-        # Generate order number (sequential)
-        order_number = generate_order_number()
+        # Generate order number (sequential). The store calls write to the
+        # database and can wait for its lock, so they run in the threadpool
+        # to keep the event loop free
+        with STAGE_SECONDS.time(stage="sequence"):
+            order_number = await run_in_threadpool(generate_order_number)
         
         # Create UPI payment link
         payment_link = create_upi_payment_link(order_number, request.totalPrice)
         
-        # Store order in database (replace with actual database)
         order_data = {
             "orderNumber": order_number,
-            "customer": request.customer.dict(),
-            "items": [item.dict() for item in request.items],
-            "totalPrice": request.totalPrice,
+            **request.model_dump(),
             "status": "pending",
             "createdAt": datetime.now().isoformat(),
             "paymentLink": payment_link
         }
         
-        # Save order to file
-        filename = save_order_to_file(order_data)
-        order_data["filename"] = filename
+        # Save the order and queue the confirmation email in one go
+        with STAGE_SECONDS.time(stage="save"):
+            await run_in_threadpool(order_store.add, order_data, notifications=["order_confirmation"])
+        outbox_worker.wake()
         
-        # Also keep in memory for quick access
-        orders_db[order_number] = order_data
-        
-        # Send confirmation email in background
-        background_tasks.add_task(
-            send_confirmation_email,
-            request.customer,
-            order_number,
-            request.items,
-            request.totalPrice
-        )
-        
-        logger.info(f"Order {order_number} created successfully and saved to {filename}")
+        logger.info(f"Order {order_number} created successfully")
         
         return CheckoutResponse(
             success=True,
             orderNumber=order_number,
             paymentLink=payment_link,
-            qrCodeUrl=payment_link  # QR code will be generated from this URL
+            # cheaper than url_for, which matches every route of the app
+            qrCodeUrl=f"{http_request.base_url}api/orders/{order_number}/qr.png"
         )
         
     except Exception as e:
@@ -349,16 +386,53 @@ async def get_order(order_number: str):
     """
     Get order details by order number
     """
-    if order_number not in orders_db:
+    order = await run_in_threadpool(order_store.get, order_number)
+    if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return orders_db[order_number]
+    return order
+
+@app.get("/api/orders/{order_number}/qr.{format}")
+async def get_order_qr_code(order_number: str, format: str, request: Request):
+    """
+    Get the QR code of the UPI payment link of an order as PNG or SVG image
+    """
+    if format not in QR_CODE_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    order = await run_in_threadpool(order_store.get, order_number)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    payment_link = order["paymentLink"]
+    etag = '"' + hashlib.sha1(f"{format}:{payment_link}".encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    # generating the image is CPU bound, keep it off the event loop
+    content = await run_in_threadpool(generate_qr_code, payment_link, format)
+    return Response(content=content, media_type=QR_CODE_MEDIA_TYPES[format], headers=headers)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Metrics in the Prometheus text format"""
+    # the outbox gauge reads the order database
+    content = await run_in_threadpool(REGISTRY.render)
+    return Response(content=content, media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    pending = await run_in_threadpool(order_store.outbox_pending)
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "outbox": {"pending": pending},
+        "mail": mail_sender.stats()
+    }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
+    # WEB_CONCURRENCY sets the number of worker processes
+    uvicorn.run("api:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WEB_CONCURRENCY", "1"))) 
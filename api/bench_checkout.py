@@ -0,0 +1,121 @@
+"""Benchmark for the checkout endpoint.
+
+Usage:
+
+    python bench_checkout.py [-n 2000] [-c 16] [--items 3]
+
+Sends checkout requests straight to the ASGI app, in-process, and reports
+the throughput and the latency percentiles. The orders are written to a
+real SQLite database in a temporary directory, so the numbers include the
+inserts into the orders and outbox tables along with the request
+validation, the order building and the serialisation. No emails are sent.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+def make_checkout_request(num_items):
+    return {
+        "customer": {
+            "name": "Test User",
+            "email": "test@example.com",
+            "phone": "1234567890",
+            "addressLine1": "123 Test St",
+            "city": "Test City",
+            "state": "Test State",
+            "pinCode": "123456"
+        },
+        "items": [
+            {"id": f"kit-{i}", "title": f"String Art Kit {i}", "price": 499.0, "quantity": 2}
+            for i in range(num_items)
+        ],
+        "totalPrice": 998.0 * num_items,
+    }
+
+async def post(app, path, body):
+    """Sends a POST request to the ASGI app and returns the status code.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def run(app, body, num_requests, concurrency):
+    latencies = []
+    counter = itertools.count()
+
+    async def client():
+        while next(counter) < num_requests:
+            start = time.perf_counter()
+            status = await post(app, "/api/checkout", body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise Exception(f"checkout failed with status {status}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for i in range(concurrency)])
+    return time.perf_counter() - start, latencies
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", "--requests", type=int, default=2000, help="number of requests")
+    p.add_argument("-c", "--concurrency", type=int, default=16, help="number of concurrent clients")
+    p.add_argument("--items", type=int, default=3, help="number of items in the cart")
+    args = p.parse_args()
+
+    # keep the orders in a temporary directory and don't send any emails.
+    # An in-memory database won't do, as the store is used from the
+    # threadpool and every thread would get a database of its own.
+    os.chdir(tempfile.mkdtemp())
+    os.environ["OUTBOX_WORKER"] = "0"
+    logging.disable(logging.WARNING)
+
+    import api
+
+    body = json.dumps(make_checkout_request(args.items)).encode()
+
+    async def benchmark():
+        async with api.app.router.lifespan_context(api.app):
+            # warm up
+            await run(api.app, body, 100, args.concurrency)
+            return await run(api.app, body, args.requests, args.concurrency)
+
+    elapsed, latencies = asyncio.run(benchmark())
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.items} items")
+    print(f"throughput: {args.requests/elapsed:8.0f} requests/sec")
+    print(f"latency:    p50 {q[49]*1000:.2f}ms  p90 {q[89]*1000:.2f}ms  p99 {q[98]*1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Micro-benchmark for rendering the order confirmation email.
+
+Usage:
+
+    python bench_email.py [-n 1000]
+
+Reports the time taken to render one email, for orders with 1, 10 and 100
+items in the cart.
+"""
+import argparse
+import logging
+import timeit
+
+from api import render_confirmation_email
+
+def make_order(num_items):
+    return {
+        "orderNumber": "001",
+        "customer": {
+            "name": "Test User",
+            "email": "test@example.com",
+            "phone": "1234567890",
+            "addressLine1": "123 Test St",
+            "addressLine2": None,
+            "city": "Test City",
+            "state": "Test State",
+            "pinCode": "123456"
+        },
+        "items": [
+            {"id": f"kit-{i}", "title": f"String Art Kit {i}", "price": 499.0, "quantity": 1}
+            for i in range(num_items)
+        ],
+        "totalPrice": 499.0 * num_items,
+    }
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", "--number", type=int, default=1000, help="number of renders per measurement")
+    args = p.parse_args()
+
+    logging.disable(logging.INFO)
+
+    for num_items in [1, 10, 100]:
+        order = make_order(num_items)
+        times = timeit.repeat(lambda: render_confirmation_email(order), number=args.number, repeat=5)
+        best = min(times) / args.number
+        print(f"{num_items:4d} items: {best*1e6:8.1f} us per email")
+
+if __name__ == "__main__":
+    main()
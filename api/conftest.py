@@ -0,0 +1,97 @@
+"""Fixtures for the tests of the checkout API.
+
+api.py reads its configuration from the environment when it is imported,
+so the environment is set up here, before any test imports it. Every test
+gets a fresh order database in its own directory.
+
+The emails are sent to a local SMTP server, run with aiosmtpd.
+"""
+import asyncio
+import os
+import socket
+import tempfile
+
+os.environ["ORDERS_DIR"] = tempfile.mkdtemp(prefix="orders-")
+os.environ["OUTBOX_WORKER"] = "0"
+
+import httpx
+import pytest
+from aiosmtpd.controller import Controller
+
+import api
+from store import SQLiteOrderRepository
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def order_store(tmp_path, monkeypatch):
+    """The order store of the app, with a new database in tmp_path.
+    """
+    store = SQLiteOrderRepository(tmp_path / "orders.db")
+    monkeypatch.setattr(api, "ORDERS_DIR", tmp_path)
+    monkeypatch.setattr(api, "order_store", store)
+    monkeypatch.setattr(api.outbox_worker, "store", store)
+    monkeypatch.setattr(api.outbox_worker, "lock_path", tmp_path / "outbox.lock")
+    return store
+
+@pytest.fixture
+async def client(order_store):
+    """An HTTP client for the app, with the lifespan of the app running.
+    """
+    async with api.app.router.lifespan_context(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            yield client
+
+class Inbox:
+    """aiosmtpd handler that keeps the messages it receives.
+
+    Recipients in refused are rejected and every message takes delay
+    seconds to be accepted.
+    """
+    def __init__(self):
+        self.messages = []
+        self.refused = set()
+        self.delay = 0.0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refused:
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        self.messages.append(envelope)
+        return "250 OK"
+
+class SMTPServer:
+    """A local SMTP server on a free port, which can be restarted to drop
+    the connections of its clients.
+    """
+    def __init__(self):
+        self.inbox = Inbox()
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self._controller = None
+
+    def start(self):
+        self._controller = Controller(self.inbox, hostname="127.0.0.1", port=self.port)
+        self._controller.start()
+
+    def stop(self):
+        self._controller.stop()
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,16 @@
+# Configuration for running the API with multiple worker processes:
+#
+#     gunicorn api:app
+#
+# gunicorn forks the workers from a single listening socket and restarts the
+# ones that die. The uvicorn worker class comes from the uvicorn-worker
+# package in the deploy group, as uvicorn.workers is deprecated.
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# the app is imported by every worker after the fork; startup work such as
+# creating the database runs in the lifespan of each worker
+preload_app = False
@@ -0,0 +1,126 @@
+"""Load test for the API with multiple worker processes.
+
+Usage:
+
+    python loadtest.py --workers 1,2,4 [--duration 10] [--endpoint checkout]
+
+For every worker count, starts the API with gunicorn (or uvicorn --workers
+with --server uvicorn) on a fresh orders directory, keeps it busy from several client processes for the given
+duration and reports the throughput. Emails are not sent.
+
+The clients run on the same machine, so leave some cores free for them.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from bench_checkout import make_checkout_request
+
+HOST = "127.0.0.1"
+
+def client_process(port, path, body, duration, threads):
+    """Sends requests from a number of threads until the duration is over
+    and returns the number of successful requests.
+    """
+    deadline = time.monotonic() + duration
+    counts = []
+
+    def worker():
+        count = 0
+        conn = http.client.HTTPConnection(HOST, port)
+        headers = {"Content-Type": "application/json"}
+        while time.monotonic() < deadline:
+            if body is None:
+                conn.request("GET", path)
+            else:
+                conn.request("POST", path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                count += 1
+        conn.close()
+        counts.append(count)
+
+    workers = [threading.Thread(target=worker) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(counts)
+
+def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(HOST, port)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise Exception("API server did not start")
+
+def run(workers, args):
+    orders_dir = tempfile.mkdtemp()
+    env = dict(os.environ, ORDERS_DIR=orders_dir, OUTBOX_WORKER="0")
+    if args.server == "gunicorn":
+        command = ["gunicorn", "api:app", "--bind", f"{HOST}:{args.port}",
+                   "--workers", str(workers), "--log-level", "warning"]
+    else:
+        command = ["uvicorn", "api:app", "--host", HOST, "--port", str(args.port),
+                   "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    server = subprocess.Popen(
+        [sys.executable, "-m"] + command,
+        cwd=Path(__file__).parent,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(args.port)
+
+        body = json.dumps(make_checkout_request(3)).encode()
+        if args.endpoint == "checkout":
+            path = "/api/checkout"
+        else:
+            conn = http.client.HTTPConnection(HOST, args.port)
+            conn.request("POST", "/api/checkout", body=body, headers={"Content-Type": "application/json"})
+            order_number = json.loads(conn.getresponse().read())["orderNumber"]
+            path, body = f"/api/orders/{order_number}", None
+
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.starmap(
+                client_process,
+                [(args.port, path, body, args.duration, args.threads)] * args.clients)
+        return sum(results) / args.duration
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--workers", default="1,2,4", help="comma separated list of worker counts")
+    p.add_argument("--endpoint", choices=["checkout", "order"], default="checkout",
+                   help="endpoint to load: checkout or order lookup")
+    p.add_argument("--duration", type=float, default=10, help="duration of each run in seconds")
+    p.add_argument("--clients", type=int, default=4, help="number of client processes")
+    p.add_argument("--threads", type=int, default=8, help="number of threads per client process")
+    p.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    p.add_argument("--port", type=int, default=8765)
+    args = p.parse_args()
+
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        throughput = run(workers, args)
+        baseline = baseline or throughput
+        print(f"{workers:3d} workers: {throughput:8.0f} requests/sec  ({throughput/baseline:.2f}x)")
+
+if __name__ == "__main__":
+    main()
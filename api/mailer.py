@@ -0,0 +1,126 @@
+"""Email delivery for the checkout API.
+
+The MailSender keeps a single authenticated SMTP connection open and
+the outbox worker sends its batches of messages over it, instead of doing
+a TLS handshake and login for every email.
+"""
+import logging
+import smtplib
+import time
+
+logger = logging.getLogger(__name__)
+
+class MailSender:
+    """Sends emails over a long-lived SMTP connection.
+
+    The connection is reopened when the server drops it and can be closed
+    using close_if_idle() after idle_timeout seconds without any messages
+    to send.
+
+    The sender is not thread-safe and is meant to be used from a single
+    worker thread.
+    """
+    def __init__(self, host, port, user, password, use_ssl=True, timeout=30, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._server = None
+        self._last_used = 0.0
+
+        # counters
+        self.sent = 0
+        self.failed = 0
+        self.connects = 0
+        self.send_seconds = 0.0
+
+    def stats(self) -> dict:
+        """Returns the delivery counters.
+        """
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "connects": self.connects,
+            "send_seconds_total": round(self.send_seconds, 6),
+            "send_seconds_avg": round(self.send_seconds / self.sent, 6) if self.sent else 0.0,
+        }
+
+    def send(self, msg):
+        """Sends a single message, reconnecting once if the server has
+        closed the connection.
+
+        Returns None on success and the exception on failure.
+        """
+        start = time.perf_counter()
+        try:
+            try:
+                self._send(msg)
+            except smtplib.SMTPServerDisconnected:
+                logger.info("SMTP server disconnected, reconnecting")
+                self._server = None
+                self._send(msg)
+        except Exception as e:
+            self.failed += 1
+            self._log_error(msg, e)
+            # the connection is still usable after the server rejects a message
+            if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)):
+                self.close()
+            return e
+
+        self.sent += 1
+        self.send_seconds += time.perf_counter() - start
+        logger.info(f"Email sent to {msg['To']}: {msg['Subject']}")
+        return None
+
+    def _send(self, msg):
+        if self._server is None:
+            self._server = self._connect()
+        self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.connects += 1
+        return server
+
+    def close_if_idle(self):
+        """Closes the SMTP connection if it hasn't been used for
+        idle_timeout seconds.
+        """
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        """Closes the SMTP connection, if it is open.
+        """
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except smtplib.SMTPException:
+                server.close()
+            except OSError:
+                pass
+
+    def _log_error(self, msg, e):
+        if isinstance(e, smtplib.SMTPAuthenticationError):
+            logger.error(f"SMTP authentication failed for {self.user}. Check GMAIL_APP_PASSWORD.")
+        elif isinstance(e, smtplib.SMTPRecipientsRefused):
+            logger.error(f"Email recipient refused: {msg['To']}. Error: {e}")
+        elif isinstance(e, smtplib.SMTPServerDisconnected):
+            logger.error("SMTP server disconnected unexpectedly")
+        elif isinstance(e, smtplib.SMTPException):
+            logger.error(f"SMTP error occurred: {e}")
+        else:
+            logger.error(f"Unexpected error sending email to {msg['To']}: {e}")
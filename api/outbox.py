@@ -0,0 +1,198 @@
+"""Delivery of the emails queued in the outbox.
+
+Checkout only adds the emails to the outbox, in the same transaction as
+the order. The OutboxWorker picks them up from there and sends them,
+retrying failed deliveries with exponential backoff. Sent messages are
+kept for a week and then deleted.
+
+The worker runs in a background thread of the API by default. With
+multiple worker processes, only the one holding the outbox lock sends
+emails. The worker can also run as a separate process, in which case the
+API should be started with OUTBOX_WORKER=0:
+
+    python outbox.py
+"""
+import fcntl
+import logging
+import smtplib
+import threading
+import time
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class OutboxWorker:
+    """Sends the messages in the outbox of an order store.
+
+    Parameters:
+        store:
+            The OrderRepository with the outbox.
+
+        sender:
+            The MailSender used for delivering the messages.
+
+        build_message:
+            A function that takes the kind of the message and the order
+            and returns the email message to send.
+
+        lock_path:
+            Optional path of a lock file. When given, the worker waits until
+            it holds an exclusive lock on the file before sending anything.
+
+        retention:
+            Seconds to keep the sent messages for. They are deleted every
+            purge_interval seconds after that.
+    """
+    def __init__(self, store, sender, build_message,
+                 batch_size=20, poll_interval=1.0,
+                 max_attempts=8, base_delay=30, max_delay=3600,
+                 lock_path=None, retention=7*86400, purge_interval=3600):
+        self.store = store
+        self.sender = sender
+        self.build_message = build_message
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock_path = lock_path
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+        # claimed messages are not picked up again until the lease expires
+        self.lease = max(60, 2 * sender.timeout * batch_size)
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the worker thread.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the worker thread after the current batch.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.sender.close()
+
+    def wake(self):
+        """Wakes up the worker to look for new messages right away.
+        """
+        self._wakeup.set()
+
+    def run(self):
+        """Keeps sending the due messages until the worker is stopped.
+        """
+        if self.lock_path is None:
+            self._run()
+            return
+
+        with open(self.lock_path, "a") as lock_file:
+            if self._acquire_lock(lock_file):
+                logger.info("Outbox lock acquired, sending emails from this process")
+                self._run()
+
+    def _acquire_lock(self, lock_file):
+        """Waits until this process holds the lock. Returns False if the
+        worker is stopped before that.
+        """
+        while not self._stopping.is_set():
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                self._stopping.wait(self.poll_interval * 5)
+        return False
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                count = self.run_once()
+            except Exception as e:
+                logger.error(f"Error processing outbox: {e}")
+                count = 0
+
+            if time.monotonic() - self._last_purge > self.purge_interval:
+                self.purge()
+
+            if count < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self) -> int:
+        """Sends one batch of due messages and returns the number of
+        messages processed.
+        """
+        messages = self.store.claim_outbox_messages(self.batch_size, self.lease)
+        if not messages:
+            self.sender.close_if_idle()
+            return 0
+
+        ready = []
+        for m in messages:
+            try:
+                order = self.store.get(m["order_number"])
+                ready.append((m, self.build_message(m["kind"], order)))
+            except Exception as e:
+                logger.error(f"Failed to build {m['kind']} email for order {m['order_number']}: {e}")
+                self._retry(m, e)
+
+        for m, msg in ready:
+            with STAGE_SECONDS.time(stage="smtp_send"):
+                error = self.sender.send(msg)
+            if error is None:
+                self.store.mark_outbox_sent(m["id"])
+            else:
+                self._retry(m, error)
+
+        return len(messages)
+
+    def purge(self) -> int:
+        """Deletes the sent messages queued more than retention seconds ago and
+        returns the number of messages deleted.
+        """
+        self._last_purge = time.monotonic()
+        try:
+            count = self.store.purge_outbox(time.time() - self.retention)
+        except Exception as e:
+            logger.error(f"Error purging outbox: {e}")
+            return 0
+        if count:
+            logger.info(f"Deleted {count} sent messages from the outbox")
+        return count
+
+    def _retry(self, message, error):
+        attempts = message["attempts"] + 1
+        permanent = isinstance(error, smtplib.SMTPRecipientsRefused)
+        if permanent or attempts >= self.max_attempts:
+            logger.error(f"Giving up on {message['kind']} email to {message['recipient']} after {attempts} attempts")
+            retry_at = None
+        else:
+            delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+            retry_at = time.time() + delay
+        self.store.mark_outbox_failed(message["id"], str(error), retry_at)
+
+def main():
+    from api import ORDERS_DIR, mail_sender, order_store, build_order_email
+
+    logging.basicConfig(level=logging.INFO)
+    worker = OutboxWorker(order_store, mail_sender, build_order_email, lock_path=ORDERS_DIR / "outbox.lock")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mail_sender.close()
+
+if __name__ == "__main__":
+    main()
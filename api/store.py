@@ -0,0 +1,354 @@
+"""Order storage for the checkout API.
+
+Orders are stored through an OrderRepository. The SQLiteOrderRepository
+keeps them in a single SQLite database in WAL mode, so that they survive
+restarts and are shared by all the worker processes on the machine.
+
+The emails to be sent for an order are written to an outbox in the same
+transaction as the order, and delivered later by the OutboxWorker.
+
+Orders saved as JSON files by the earlier versions of the API can be
+imported using:
+
+    python store.py orders/
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """A small thread-safe cache that keeps the most recently used items.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return None
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+class OrderRepository:
+    """Interface for the order storage backends.
+
+    An order is the dict built by the checkout endpoint and it is
+    identified by its orderNumber.
+    """
+    def add(self, order: dict, notifications=()) -> None:
+        """Adds a new order.
+
+        For every kind of email in notifications, a message to the
+        customer is added to the outbox along with the order.
+        """
+        raise NotImplementedError()
+
+    def get(self, order_number: str) -> Optional[dict]:
+        """Returns the order with the given order number or None if
+        there is no such order.
+        """
+        raise NotImplementedError()
+
+    def find(self, email: Optional[str] = None, status: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Returns the most recent orders, optionally filtered by customer
+        email and status.
+        """
+        raise NotImplementedError()
+
+    def max_sequence(self) -> int:
+        """Returns the highest order sequence number in the store or 0 if
+        the store is empty.
+        """
+        raise NotImplementedError()
+
+    def next_sequence(self) -> int:
+        """Allocates the next order sequence number.
+
+        Every number is handed out exactly once, even when the store is
+        shared by multiple processes.
+        """
+        raise NotImplementedError()
+
+    def claim_outbox_messages(self, limit: int, lease: float) -> List[dict]:
+        """Returns up to limit outbox messages that are due for delivery.
+
+        The claimed messages are not returned again for lease seconds, so
+        that concurrent workers don't send the same message twice.
+        """
+        raise NotImplementedError()
+
+    def mark_outbox_sent(self, message_id: int) -> None:
+        """Marks an outbox message as sent.
+        """
+        raise NotImplementedError()
+
+    def mark_outbox_failed(self, message_id: int, error: str, retry_at: Optional[float]) -> None:
+        """Records a failed delivery of an outbox message.
+
+        The message is retried at retry_at, or given up on when it is None.
+        """
+        raise NotImplementedError()
+
+    def outbox_pending(self) -> int:
+        """Returns the number of outbox messages waiting to be sent.
+        """
+        raise NotImplementedError()
+
+    def purge_outbox(self, before: float) -> int:
+        """Deletes the sent outbox messages created before the given time
+        and returns the number of messages deleted.
+        """
+        raise NotImplementedError()
+
+class SQLiteOrderRepository(OrderRepository):
+    """Order repository backed by a SQLite database.
+
+    Each thread gets its own connection to the database. Orders are not
+    modified once they are added, so recently read orders are kept in a
+    small in-process LRU cache.
+
+    The database is created on first use, or by calling initialize().
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS orders (
+        order_number TEXT PRIMARY KEY,
+        email TEXT NOT NULL,
+        status TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS orders_email_idx ON orders (email);
+    CREATE INDEX IF NOT EXISTS orders_status_idx ON orders (status);
+    CREATE INDEX IF NOT EXISTS orders_created_at_idx ON orders (created_at);
+
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        order_number TEXT NOT NULL,
+        -- one message of each kind per recipient and order
+        dedupe_key TEXT NOT NULL UNIQUE,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS outbox_due_idx ON outbox (status, next_attempt_at);
+
+    -- last allocated order sequence number
+    CREATE TABLE IF NOT EXISTS sequences (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, path, cache_size=256):
+        self.path = Path(path)
+        self.cache = LRUCache(cache_size)
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def initialize(self, min_sequence=0):
+        """Creates the database tables, if they don't exist already.
+
+        The order sequence is made to start after min_sequence, and after
+        the highest order number in the store.
+        """
+        with self._init_lock:
+            db = self._connect()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(self.SCHEMA)
+            with db:
+                start = max(min_sequence, self.max_sequence(db))
+                db.execute("INSERT OR IGNORE INTO sequences (name, value) VALUES ('orders', ?)", (start,))
+                db.execute("UPDATE sequences SET value = MAX(value, ?) WHERE name = 'orders'", (start,))
+            self._initialized = True
+
+    def connect(self) -> sqlite3.Connection:
+        """Returns the database connection of the current thread.
+        """
+        if not self._initialized:
+            self.initialize()
+        return self._connect()
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def add(self, order, notifications=()):
+        db = self.connect()
+        with db:
+            self._insert(db, order)
+            for kind in notifications:
+                self._add_to_outbox(db, kind, order)
+        self.cache.put(order["orderNumber"], order)
+
+    def _add_to_outbox(self, db, kind, order):
+        recipient = order["customer"]["email"]
+        order_number = order["orderNumber"]
+        now = time.time()
+        db.execute(
+            "INSERT OR IGNORE INTO outbox (kind, recipient, order_number, dedupe_key, next_attempt_at, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, recipient, order_number, f"{kind}:{recipient}:{order_number}", now, now))
+
+    def _insert(self, db, order, ignore_existing=False):
+        verb = "INSERT OR IGNORE" if ignore_existing else "INSERT"
+        db.execute(
+            f"{verb} INTO orders (order_number, email, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+            (order["orderNumber"], order["customer"]["email"], order["status"], order["createdAt"],
+             json.dumps(order, ensure_ascii=False, separators=(",", ":"))))
+
+    def get(self, order_number):
+        order = self.cache.get(order_number)
+        if order is None:
+            row = self.connect().execute(
+                "SELECT data FROM orders WHERE order_number = ?", (order_number,)).fetchone()
+            if row is None:
+                return None
+            order = json.loads(row[0])
+            self.cache.put(order_number, order)
+        return order
+
+    def find(self, email=None, status=None, limit=100):
+        conditions = []
+        params = []
+        if email is not None:
+            conditions.append("email = ?")
+            params.append(email)
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = self.connect().execute(
+            f"SELECT data FROM orders {where} ORDER BY created_at DESC LIMIT ?",
+            params + [limit])
+        return [json.loads(data) for data, in rows]
+
+    def max_sequence(self, db=None):
+        db = db or self.connect()
+        row = db.execute("SELECT MAX(CAST(order_number AS INTEGER)) FROM orders").fetchone()
+        return row[0] or 0
+
+    def next_sequence(self):
+        db = self.connect()
+        # the UPDATE takes the write lock, so no two connections can read
+        # the same value
+        with db:
+            db.execute("UPDATE sequences SET value = value + 1 WHERE name = 'orders'")
+            row = db.execute("SELECT value FROM sequences WHERE name = 'orders'").fetchone()
+        return row[0]
+
+    def claim_outbox_messages(self, limit, lease):
+        db = self.connect()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so that two
+        # workers can't claim the same messages
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT id, kind, recipient, order_number, attempts FROM outbox"
+                " WHERE status = 'pending' AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at LIMIT ?",
+                (now, limit)).fetchall()
+            db.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + lease, row[0]) for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        keys = ["id", "kind", "recipient", "order_number", "attempts"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def mark_outbox_sent(self, message_id):
+        db = self.connect()
+        with db:
+            db.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                (message_id,))
+
+    def mark_outbox_failed(self, message_id, error, retry_at):
+        db = self.connect()
+        with db:
+            if retry_at is None:
+                db.execute(
+                    "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (error, message_id))
+            else:
+                db.execute(
+                    "UPDATE outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (error, retry_at, message_id))
+
+    def outbox_pending(self):
+        # counted on outbox_due_idx, without reading the sent messages
+        row = self.connect().execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()
+        return row[0]
+
+    def purge_outbox(self, before):
+        db = self.connect()
+        with db:
+            cursor = db.execute("DELETE FROM outbox WHERE status = 'sent' AND created_at < ?", (before,))
+        return cursor.rowcount
+
+    def import_json_orders(self, orders_dir) -> int:
+        """Imports the orders saved as JSON files in orders_dir.
+
+        Orders that are already in the store are left untouched, so it is
+        safe to run this more than once. Returns the number of files read.
+        """
+        db = self.connect()
+        count = 0
+        for file_path in sorted(Path(orders_dir).glob("*.json")):
+            order = json.loads(file_path.read_text(encoding="utf-8"))
+            order.pop("filename", None)
+            with db:
+                self._insert(db, order, ignore_existing=True)
+            count += 1
+        logger.info(f"Imported {count} orders from {orders_dir}")
+        return count
+
+def main():
+    p = argparse.ArgumentParser(description="Import orders saved as JSON files into the order database")
+    p.add_argument("orders_dir", help="directory with the order JSON files")
+    p.add_argument("--db", help="path to the order database (default: ORDERS_DIR/orders.db)")
+    args = p.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db_path = args.db or Path(args.orders_dir) / "orders.db"
+    store = SQLiteOrderRepository(db_path)
+    store.import_json_orders(args.orders_dir)
+    # make sure the imported order numbers are not allocated again
+    store.initialize()
+
+if __name__ == "__main__":
+    main()
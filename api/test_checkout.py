@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from bench_checkout import make_checkout_request
+from store import SQLiteOrderRepository
+
+pytestmark = pytest.mark.anyio
+
+async def test_checkout(client, order_store):
+    response = await client.post("/api/checkout", json=make_checkout_request(1))
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"]
+    assert data["orderNumber"] == "001"
+    assert data["qrCodeUrl"] == "http://testserver/api/orders/001/qr.png"
+
+    order = (await client.get("/api/orders/001")).json()
+    assert order["paymentLink"] == data["paymentLink"]
+    assert order_store.max_sequence() == 1
+    assert order_store.outbox_pending() == 1
+
+async def test_concurrent_checkouts(client, order_store):
+    n = 300
+    requests = []
+    for i in range(n):
+        request = make_checkout_request(1 + i % 3)
+        request["customer"]["email"] = f"customer{i}@example.com"
+        requests.append(request)
+
+    responses = await asyncio.gather(*[client.post("/api/checkout", json=r) for r in requests])
+    assert [r.status_code for r in responses] == [200] * n
+
+    numbers = [r.json()["orderNumber"] for r in responses]
+    assert len(set(numbers)) == n
+    assert sorted(int(number) for number in numbers) == list(range(1, n + 1))
+
+    # each response is for the order stored under its number, read back
+    # from the database rather than the cache of the store
+    stored = SQLiteOrderRepository(order_store.path)
+    for request, response in zip(requests, responses):
+        order = stored.get(response.json()["orderNumber"])
+        assert order["customer"]["email"] == request["customer"]["email"]
+        assert order["totalPrice"] == request["totalPrice"]
+        assert order["paymentLink"] == response.json()["paymentLink"]
+    assert order_store.outbox_pending() == n
+
+async def test_metrics(client, order_store):
+    await client.post("/api/checkout", json=make_checkout_request(1))
+    metrics = (await client.get("/metrics")).text
+    assert "outbox_pending_messages 1\n" in metrics
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/checkout",status="200"}' in metrics
@@ -0,0 +1,64 @@
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+from mailer import MailSender
+
+def make_message(recipient, subject="Order Confirmation"):
+    msg = EmailMessage()
+    msg["From"] = "orders@stringart.in"
+    msg["To"] = recipient
+    msg["Subject"] = subject
+    msg.set_content("Thank you for your order")
+    return msg
+
+@pytest.fixture
+def sender(smtp_server):
+    sender = MailSender("127.0.0.1", smtp_server.port, None, None, use_ssl=False, timeout=5)
+    yield sender
+    sender.close()
+
+def test_batch_uses_one_connection(sender, smtp_server):
+    for i in range(10):
+        assert sender.send(make_message(f"customer{i}@example.com")) is None
+
+    assert sender.connects == 1
+    assert sender.sent == 10
+    assert sender.failed == 0
+    assert [m.rcpt_tos for m in smtp_server.inbox.messages] == [[f"customer{i}@example.com"] for i in range(10)]
+
+def test_reconnects_when_server_disconnects(sender, smtp_server):
+    assert sender.send(make_message("first@example.com")) is None
+    # the server drops the connection, the next send gets SMTPServerDisconnected
+    smtp_server.restart()
+    assert sender.send(make_message("second@example.com")) is None
+
+    assert sender.connects == 2
+    assert sender.sent == 2
+    assert sender.failed == 0
+    assert len(smtp_server.inbox.messages) == 2
+
+def test_connection_kept_after_recipient_refused(sender, smtp_server):
+    smtp_server.inbox.refused.add("nobody@example.com")
+
+    error = sender.send(make_message("nobody@example.com"))
+    assert isinstance(error, smtplib.SMTPRecipientsRefused)
+    assert sender.send(make_message("customer@example.com")) is None
+
+    assert sender.connects == 1
+    assert sender.sent == 1
+    assert sender.failed == 1
+    assert [m.rcpt_tos for m in smtp_server.inbox.messages] == [["customer@example.com"]]
+
+def test_counts_failures_when_server_is_down(sender, smtp_server):
+    smtp_server.stop()
+    assert sender.send(make_message("customer@example.com")) is not None
+    smtp_server.start()
+    assert sender.send(make_message("customer@example.com")) is None
+
+    assert sender.connects == 1
+    assert sender.sent == 1
+    assert sender.failed == 1
+    assert sender.stats()["sent"] == 1
+    assert sender.stats()["failed"] == 1
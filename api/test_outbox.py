@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+import api
+from bench_checkout import make_checkout_request
+from mailer import MailSender
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def outbox_worker(client, smtp_server, monkeypatch):
+    """The outbox worker of the app, sending to the local SMTP server. It
+    is stopped before the server.
+    """
+    sender = MailSender("127.0.0.1", smtp_server.port, None, None, use_ssl=False, timeout=5)
+    monkeypatch.setattr(api, "mail_sender", sender)
+    monkeypatch.setattr(api.outbox_worker, "sender", sender)
+    yield api.outbox_worker
+    api.outbox_worker.stop()
+
+def add_orders(store, n):
+    for i in range(n):
+        order = {
+            "orderNumber": f"{store.next_sequence():03d}",
+            **make_checkout_request(1),
+            "status": "pending",
+            "createdAt": "2025-01-01T00:00:00",
+            "paymentLink": "upi://pay",
+        }
+        order["customer"]["email"] = f"customer{i}@example.com"
+        store.add(order, notifications=["order_confirmation"])
+
+async def health_latencies(client, n):
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        response = await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return latencies
+
+def p99(latencies):
+    return sorted(latencies)[int(len(latencies) * 0.99) - 1]
+
+async def test_outbox_delivers_emails(client, order_store, smtp_server, outbox_worker):
+
+    add_orders(order_store, 30)
+    outbox_worker.start()
+    for i in range(100):
+        if order_store.outbox_pending() == 0:
+            break
+        await asyncio.sleep(0.05)
+
+    assert order_store.outbox_pending() == 0
+    assert len(smtp_server.inbox.messages) == 30
+    health = (await client.get("/health")).json()
+    assert health["outbox"] == {"pending": 0}
+    assert health["mail"]["sent"] == 30
+    assert health["mail"]["connects"] == 1
+
+async def test_health_latency_while_outbox_drains(client, order_store, smtp_server, outbox_worker):
+    # every email takes 50ms, so sending them from the event loop would
+    # show up in the latency of /health
+    smtp_server.inbox.delay = 0.05
+    add_orders(order_store, 100)
+
+    before = await health_latencies(client, 1000)
+
+    outbox_worker.start()
+    while not smtp_server.inbox.messages:
+        await asyncio.sleep(0.01)
+    during = await health_latencies(client, 1000)
+
+    # the worker was still sending while /health was measured
+    assert order_store.outbox_pending() > 0
+    assert p99(during) < max(3 * p99(before), p99(before) + 0.025)
@@ -0,0 +1,4 @@
+"""Helpers shared by the build of the designs and of the string art
+patterns in website/patterns: buildcache skips the outputs that are up to
+date and devserver rebuilds them as they are edited.
+"""
@@ -0,0 +1,45 @@
+"""Helpers for skipping the builds that are up to date, shared by the
+build of the designs and of the string art patterns in website/patterns.
+
+A build keeps the hash of everything an output depends on in a json file,
+keyed by the output path, and only builds the outputs whose hash has
+changed.
+"""
+import ast
+import json
+from pathlib import Path
+
+def find_local_imports(filename):
+    """Returns the paths of the modules next to filename that it imports,
+    directly or through other local modules.
+    """
+    src_dir = Path(filename).parent
+    found = []
+    pending = [Path(filename)]
+    while pending:
+        tree = ast.parse(pending.pop().read_text())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                path = src_dir / (name.split(".")[0] + ".py")
+                if path.exists() and path not in found:
+                    found.append(path)
+                    pending.append(path)
+    return sorted(found)
+
+def load_cache(path):
+    """Returns the hashes saved in the cache file at path, or an empty dict
+    if there is no cache yet.
+    """
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_cache(path, cache):
+    Path(path).write_text(json.dumps(cache, indent=2, sort_keys=True) + "\n")
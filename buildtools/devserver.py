@@ -0,0 +1,331 @@
+"""Rebuilds the images when their scripts change and shows them in the
+browser.
+
+Used by `build.py --watch` in designs/ and website/patterns. The server
+keeps running, with joy and everything else already imported, so a rebuild
+is only the time taken to run the script again. When the build script or
+one of the modules it has already imported changes, the server restarts
+with the new code instead. The files are watched with
+inotify on Linux, or by checking their modification times elsewhere. The
+page at http://localhost:8765/ has every image and is updated over a
+websocket as soon as an image is rebuilt.
+"""
+import base64
+import ctypes
+import ctypes.util
+import hashlib
+import html
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_PORT = 8765
+
+# from linux/inotify.h, a file is only read again once it is written
+# completely, either in place or by moving a new file over it
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+
+# the changes that come together when an editor saves a file
+DEBOUNCE = 0.02
+
+class InotifyWatcher:
+    """Watches directories for changed files using inotify.
+    """
+    def __init__(self, dirs):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO
+        for d in dirs:
+            wd = self.libc.inotify_add_watch(self.fd, str(d).encode(), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {d}")
+            self.dirs[wd] = Path(d)
+
+    def _read(self):
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0").decode()
+            offset += 16 + length
+            if name and wd in self.dirs:
+                changed.add((self.dirs[wd] / name).resolve())
+        return changed
+
+    def wait(self):
+        """Waits for files to change and returns their paths.
+        """
+        select.select([self.fd], [], [])
+        changed = self._read()
+        while select.select([self.fd], [], [], DEBOUNCE)[0]:
+            changed |= self._read()
+        return changed
+
+class PollingWatcher:
+    """Watches directories for changed files by checking the modification
+    times of the files in them.
+    """
+    def __init__(self, dirs, interval=0.1):
+        self.dirs = [Path(d) for d in dirs]
+        self.interval = interval
+        self.mtimes = self._scan()
+
+    def _scan(self):
+        mtimes = {}
+        for d in self.dirs:
+            for entry in os.scandir(d):
+                if entry.is_file():
+                    mtimes[Path(entry.path).resolve()] = entry.stat().st_mtime_ns
+        return mtimes
+
+    def wait(self):
+        while True:
+            time.sleep(self.interval)
+            mtimes = self._scan()
+            changed = {p for p, t in mtimes.items() if self.mtimes.get(p) != t}
+            self.mtimes = mtimes
+            if changed:
+                return changed
+
+def make_watcher(dirs):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(dirs)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(dirs)
+
+def forget_modules(paths):
+    """Removes the modules loaded from any of the paths from sys.modules,
+    so that the next import runs them again.
+    """
+    for name, module in list(sys.modules.items()):
+        filename = getattr(module, "__file__", None)
+        if filename and Path(filename).resolve() in paths:
+            del sys.modules[name]
+
+# https://www.rfc-editor.org/rfc/rfc6455#section-1.3
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def websocket_frame(text):
+    """Returns a websocket text frame with the text, as sent by a server.
+    """
+    data = text.encode()
+    if len(data) < 126:
+        header = struct.pack("!BB", 0x81, len(data))
+    elif len(data) < 1 << 16:
+        header = struct.pack("!BBH", 0x81, 126, len(data))
+    else:
+        header = struct.pack("!BBQ", 0x81, 127, len(data))
+    return header + data
+
+PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 1em; background: #f6f6f6; }}
+.image {{ display: inline-block; vertical-align: top; margin: 0.5em; padding: 0.5em; background: white; }}
+.image img {{ width: 300px; height: 300px; display: block; }}
+.image pre {{ width: 300px; color: #b00; white-space: pre-wrap; }}
+.status {{ font-size: small; color: #666; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{images}
+<script>
+function connect() {{
+    const ws = new WebSocket(`ws://${{location.host}}/ws`);
+    ws.onmessage = (event) => {{
+        const image = JSON.parse(event.data);
+        const div = document.getElementById(image.name);
+        div.querySelector(".content").innerHTML = image.html;
+        div.querySelector(".status").textContent = image.status;
+    }};
+    ws.onclose = () => setTimeout(connect, 1000);
+}}
+connect();
+</script>
+</body>
+</html>
+"""
+
+class Images:
+    """The latest image built from every script, as html, and the browsers
+    to tell when they change.
+    """
+    def __init__(self):
+        self.images = {}
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def update(self, name, html, status):
+        message = json.dumps({"name": name, "html": html, "status": status})
+        with self.lock:
+            self.images[name] = (html, status)
+            clients = list(self.clients)
+        for client in clients:
+            client.send(message)
+
+    def page(self, title):
+        with self.lock:
+            images = dict(self.images)
+        divs = [
+            f'<div class="image" id="{html.escape(name)}"><b>{html.escape(name)}</b>'
+            f'<div class="content">{content}</div><div class="status">{html.escape(status)}</div></div>'
+            for name, (content, status) in images.items()]
+        return PAGE.format(title=html.escape(title), images="\n".join(divs))
+
+def image_html(svg):
+    """Returns the html to show the svg.
+
+    The svg is shown as an image, not inline, so that the ids in different
+    svgs don't clash.
+    """
+    data = base64.b64encode(svg.encode()).decode()
+    return f'<img src="data:image/svg+xml;base64,{data}">'
+
+def make_handler(images, title):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/ws" and self.headers.get("Upgrade", "").lower() == "websocket":
+                self.websocket()
+            elif self.path == "/":
+                self.respond(200, "text/html; charset=utf-8", images.page(title).encode())
+            else:
+                self.respond(404, "text/plain", b"not found\n")
+
+        def respond(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def websocket(self):
+            key = self.headers["Sec-WebSocket-Key"]
+            accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+            self.send_response(101)
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.wfile.flush()
+
+            self.lock = threading.Lock()
+            with images.lock:
+                images.clients.append(self)
+            try:
+                # nothing is expected from the browser, read until it closes
+                while self.read_frame():
+                    pass
+            finally:
+                with images.lock:
+                    images.clients.remove(self)
+                self.close_connection = True
+
+        def read_frame(self):
+            header = self.rfile.read(2)
+            if len(header) < 2 or header[0] & 0x0f == 0x8:
+                return False
+            length = header[1] & 0x7f
+            if length == 126:
+                length, = struct.unpack("!H", self.rfile.read(2))
+            elif length == 127:
+                length, = struct.unpack("!Q", self.rfile.read(8))
+            # the mask and the payload
+            self.rfile.read(4 + length if header[1] & 0x80 else length)
+            return True
+
+        def send(self, text):
+            try:
+                with self.lock:
+                    self.wfile.write(websocket_frame(text))
+                    self.wfile.flush()
+            except OSError:
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(sources, rebuild, dependencies, title="build", port=DEFAULT_PORT, restart_on=()):
+    """Builds the sources and rebuilds them whenever they or their
+    dependencies change, until interrupted.
+
+    rebuild(source) builds one source, writes its output and returns the
+    svg. dependencies(source) returns the paths of the local modules the
+    source imports. restart_on are the paths of the build script and the
+    modules it uses, which all the sources depend on. When any of them
+    changes, the process is started again with the same arguments.
+    """
+    sources = [Path(s).resolve() for s in sources]
+    restart = {Path(p).resolve() for p in restart_on}
+    images = Images()
+
+    def build(source):
+        start = time.perf_counter()
+        try:
+            svg = rebuild(source)
+            content = image_html(svg) if svg else "<pre>nothing to show</pre>"
+            status = f"built in {(time.perf_counter() - start) * 1000:.0f}ms"
+        except Exception as e:
+            error = "".join(traceback.format_exception_only(e))
+            content = f"<pre>{html.escape(error)}</pre>"
+            status = "failed"
+            print(f"{source.name}: {error.splitlines()[0]}", file=sys.stderr)
+        else:
+            print(f"{source.name}: {status}", file=sys.stderr)
+        images.update(source.stem, content, status)
+
+    server = ThreadingHTTPServer(("localhost", port), make_handler(images, title))
+    server.daemon_threads = True
+    for source in sources:
+        build(source)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"watching {len(sources)} files, see http://localhost:{port}/", file=sys.stderr)
+
+    def depends_on(source, changed):
+        try:
+            return any(Path(p).resolve() in changed for p in dependencies(source))
+        except (SyntaxError, OSError):
+            # the source is rebuilt anyway when it can't be parsed
+            return False
+
+    dirs = {source.parent for source in sources} | {path.parent for path in restart}
+    watcher = make_watcher(dirs)
+    try:
+        while True:
+            changed = watcher.wait()
+            if changed & restart:
+                break
+            forget_modules(changed)
+            for source in sources:
+                if source in changed or depends_on(source, changed):
+                    build(source)
+    except KeyboardInterrupt:
+        return
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # the modules imported by the build script are not loaded again, start
+    # over with the new code
+    names = ", ".join(sorted(path.name for path in changed & restart))
+    print(f"{names} changed, restarting", file=sys.stderr)
+    os.execv(sys.executable, [sys.executable] + sys.argv)
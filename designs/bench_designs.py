@@ -0,0 +1,62 @@
+"""Measures the time taken to make many polygon variants, with and without
+the cache of the shapes in _designs.py.
+
+Usage:
+
+    python bench_designs.py [-n 1000]
+
+The variants are polygons with 3 to 12 sides, different side lengths and
+numbers of holes, all with the same holes, like a sweep would make them.
+Reports the time to make the shapes and to make them and render the svg,
+once with the caches cleared before every variant and once with the
+caches kept, and the time to make the same variants again.
+"""
+import argparse
+import itertools
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+import _designs
+from _designs import clear_caches, make_polygon, mm
+
+def variants(count):
+    sides = range(3, 13)
+    lengths = [(30 + 5*i)*mm for i in range(10)]
+    holes = range(6, 6 + max(1, count // 100))
+    grid = itertools.product(sides, lengths, holes)
+    return [dict(n=n, side_length=length, num_holes=num_holes)
+            for n, length, num_holes in itertools.islice(grid, count)]
+
+def run(params, cached=True, render=False):
+    start = time.perf_counter()
+    for p in params:
+        if not cached:
+            clear_caches()
+        shape = make_polygon(**p)
+        if render:
+            shape.as_svg()
+    return time.perf_counter() - start
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", "--number", type=int, default=1000, help="number of variants")
+    args = p.parse_args()
+
+    params = variants(args.number)
+    print(f"{len(params)} variants, {len({(v['num_holes'], v['side_length']) for v in params})} distinct hole rows")
+    print(f"{'':12s} {'uncached':>10s} {'cached':>10s} {'again':>10s}")
+    for render in (False, True):
+        uncached = run(params, cached=False, render=render)
+        clear_caches()
+        cached = run(params, render=render)
+        again = run(params, render=render)
+        label = "make + svg" if render else "make"
+        print(f"{label:12s} {uncached*1000:8.1f}ms {cached*1000:8.1f}ms {again*1000:8.1f}ms")
+    print(f"cached shapes: {len(_designs.make_polygon.cache)} polygons, "
+          f"{len(_designs.make_hole_row.cache)} hole rows, {len(_designs.make_hole.cache)} holes")
+
+if __name__ == "__main__":
+    main()
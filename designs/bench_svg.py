@@ -0,0 +1,46 @@
+"""Compares the size and the parse time of the svg files with their
+compact versions.
+
+Usage:
+
+    python bench_svg.py [--precision 3] [svg/*.svg]
+
+The parse time is the time taken to parse the xml and the load time also
+includes resolving all the references and transforms, which is what the
+laser cutter software has to do before it can cut anything.
+"""
+import argparse
+import glob
+import timeit
+import xml.etree.ElementTree as ET
+
+from svgtools import compact_svg, flatten
+
+def best_time(f, number=20):
+    return min(timeit.repeat(f, number=number, repeat=5)) / number
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filenames", nargs="*")
+    p.add_argument("--precision", type=int, default=3)
+    args = p.parse_args()
+
+    filenames = args.filenames or sorted(glob.glob("svg/*.svg"))
+
+    print(f"{'design':28s} {'bytes':>15s} {'parse ms':>13s} {'load ms':>13s}")
+    totals = [0, 0]
+    for filename in filenames:
+        svg = open(filename).read()
+        compact = compact_svg(svg, precision=args.precision)
+        totals[0] += len(svg)
+        totals[1] += len(compact)
+
+        parse = [best_time(lambda: ET.fromstring(s)) * 1000 for s in (svg, compact)]
+        load = [best_time(lambda: flatten(s)) * 1000 for s in (svg, compact)]
+        print(f"{filename:28s} {len(svg):7d} {len(compact):7d} "
+              f"{parse[0]:6.2f} {parse[1]:6.2f} {load[0]:6.2f} {load[1]:6.2f}")
+
+    print(f"{'total':28s} {totals[0]:7d} {totals[1]:7d}  ({totals[1]/totals[0]:.0%} of the size)")
+
+if __name__ == "__main__":
+    main()
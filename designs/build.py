@@ -1,57 +1,370 @@
+"""Builds the SVG files of the designs.
+
+Usage:
+
+    python build.py -o svg/hexagon.svg src/hexagon.py
+    python build.py -d svg src/[a-z]*.py
+    python build.py -d svg --compact --precision 3 src/[a-z]*.py
+    python build.py -d png --format png --dpi 300 src/[a-z]*.py
+    python build.py -o catalogue.pdf --format pdf src/[a-z]*.py
+
+With more than one design, all of them are built in one batch, spread
+across a pool of worker processes, and the time taken for every design is
+reported. A design that fails doesn't stop the others from being built.
+The helper modules, the ones starting with _, are not designs and are
+skipped.
+
+The designs whose script, imported helper modules like _designs.py, joy
+version and build.py are unchanged since the last build are skipped. The
+hashes are kept in .build-cache.json.
+
+With --compact, the svg is rewritten with the repeated shapes defined once
+and the numbers rounded, see svgtools.compact_svg. With --toolpath, every
+shape is written out at its final position, in the order that keeps the
+travel of the laser head short, see toolpath.py.
+
+With --format pdf or png, the designs are exported using export.py instead
+of writing the svg. Building many designs into a single pdf makes one page
+per design, with the pages rendered in parallel.
+
+Every design is checked for holes too close to each other or to the edge,
+see drc.py, and the ones that break the rules are not written. Use
+--no-drc to build them anyway.
+
+With --watch, the designs are built and then rebuilt whenever they or the
+modules they import change, and shown in the browser, see
+buildtools/devserver.py. Changes to build.py or the modules next to it
+restart the preview.
+"""
 import argparse
 import ast
+import hashlib
+import itertools
+import os
 import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import joy
+from drc import MIN_CLEARANCE, MIN_SPACING, DesignRuleError, check_svg
+from export import pdf_page, write_pdf, write_png
+from svgtools import compact_svg
+from toolpath import optimize_svg
 
-p = argparse.ArgumentParser()
-p.add_argument("filename")
-p.add_argument("-o", "--output", help="output filename")
-args = p.parse_args()
+# the helpers shared with website/patterns are in buildtools/ at the top
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from buildtools.buildcache import find_local_imports, load_cache, save_cache
 
-if args.output is None:
-    args.output = args.filename.replace(".py", ".png")
+CACHE_FILE = Path(__file__).parent / ".build-cache.json"
 
-code = open(args.filename).read()
+# build.py and the modules it uses, which every design depends on
+HERE = Path(__file__).resolve().parent
+BUILD_SOURCES = [HERE / name for name in ("build.py", "svgtools.py", "toolpath.py", "export.py", "drc.py")]
 
-SHAPES = []
-
-def show(*shapes):
-    SHAPES.extend(shapes)
-
-def exec_notebook(code, env):
+def exec_notebook(code, env, filename="<input>"):
     """Exec the code in the nodebook mode.
 
     In the notebook mode, the last expression is displayed.
     """
-    mod = ast.parse(code)
+    mod = ast.parse(code, filename)
     head = ast.Module(mod.body[:-1], [])
     tail = ast.Interactive(mod.body[-1:])
 
     def do_exec(node, mode):
-        code_obj = compile(node, "<input>", mode)
+        code_obj = compile(node, filename, mode)
         exec(code_obj, env)
 
     do_exec(head, "exec")
     do_exec(tail, "single")
 
-_displayhook = sys.displayhook
+def load_shapes(filename):
+    """Runs a design script and returns the shapes it shows.
+
+    The script runs in a fresh namespace with everything from joy and a
+    show function that collects the shapes, so that nothing leaks from
+    one design to the next. The scripts do `from joy import *`, so joy.show
+    is replaced with the same function while the script runs.
+    """
+    shapes = []
+
+    def show(*args):
+        shapes.extend(args)
+
+    def displayhook(obj):
+        if isinstance(obj, joy.Shape):
+            show(obj)
+        else:
+            _displayhook(obj)
+
+    env = dict(joy.__dict__, __name__="__main__", __file__=str(filename), show=show)
 
-def displayhook(obj):
-    if isinstance(obj, joy.Shape):
-        show(obj)
+    # the helper modules like _designs.py are next to the designs
+    src_dir = str(Path(filename).parent.resolve())
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+
+    code = Path(filename).read_text()
+    _displayhook, _show = sys.displayhook, joy.show
+    sys.displayhook, joy.show = displayhook, show
+    try:
+        exec_notebook(code, env, filename=str(filename))
+    finally:
+        sys.displayhook, joy.show = _displayhook, _show
+    return shapes
+
+def render_svg(shapes):
+    shape = joy.combine(shapes) | joy.scale(x=1, y=-1)
+    return shape.as_svg()
+
+def render_design(make_shapes):
+    """Calls make_shapes and returns the svg of the shapes it returns, or
+    None if there are none.
+
+    The shape ids are numbered from zero, as if it were the only design
+    built, so that the svg doesn't depend on what was built before it in
+    the same process. This is the only place that touches the internals
+    of joy.
+    """
+    joy._shape_counter = itertools.count()
+    shapes = make_shapes()
+    if not shapes:
+        return None
+    return render_svg(shapes)
+
+def make_svg(filename, compact=False, toolpath=False, precision=3,
+             drc=True, min_spacing=MIN_SPACING, min_clearance=MIN_CLEARANCE):
+    """Runs the design in filename and returns its svg, or None if it
+    doesn't show anything.
+
+    Raises DesignRuleError if drc is true and the design breaks the design
+    rules.
+    """
+    svg = render_design(lambda: load_shapes(filename))
+    if svg is None:
+        return None
+    if drc:
+        check_svg(svg, min_spacing=min_spacing, min_clearance=min_clearance)
+    return postprocess(svg, compact=compact, toolpath=toolpath, precision=precision)
+
+def postprocess(svg, compact=False, toolpath=False, precision=3):
+    """Applies the --compact or --toolpath rewriting to the svg.
+    """
+    if toolpath:
+        return optimize_svg(svg, precision=precision)
+    elif compact:
+        return compact_svg(svg, precision=precision)
+    return svg
+
+def build(filename, output, format="svg", dpi=96, **options):
+    """Builds the design in filename and writes it to output in the given
+    format.
+
+    Returns the time taken in seconds.
+    """
+    start = time.perf_counter()
+    svg = make_svg(filename, **options)
+    if svg is None:
+        pass
+    elif format == "pdf":
+        write_pdf([pdf_page(svg)], output)
+    elif format == "png":
+        write_png(svg, output, dpi=dpi)
     else:
-        _displayhook(obj)
-sys.displayhook = displayhook
+        Path(output).write_text(svg)
+    return time.perf_counter() - start
+
+def build_page(filename, **options):
+    """Builds the design in filename as a pdf page.
 
-env = joy.__dict__
-env['show'] = show
-exec_notebook(code, env)
+    Returns the page and the time taken in seconds.
+    """
+    start = time.perf_counter()
+    svg = make_svg(filename, **options)
+    page = svg and pdf_page(svg)
+    return page, time.perf_counter() - start
+
+def compute_key(filename, options):
+    """Returns the hash of everything the output of a design depends on.
+    """
+    h = hashlib.sha256()
+    h.update(f"joy {joy.__version__}\n".encode())
+    h.update(f"{sorted(options.items())}\n".encode())
+    for path in BUILD_SOURCES + [Path(filename)] + find_local_imports(filename):
+        h.update(f"{path.name}\n".encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+def report_failure(filename, e):
+    """Prints why a design failed to build, with the traceback unless it
+    only breaks the design rules.
+    """
+    if isinstance(e, DesignRuleError):
+        print(f"{filename}: {e}", file=sys.stderr)
+    else:
+        print(f"{filename}: failed", file=sys.stderr)
+        traceback.print_exception(type(e), e, e.__traceback__)
+
+def build_batch(jobs, max_workers=None, **options):
+    """Builds many designs in a pool of worker processes.
+
+    The jobs are (filename, output) pairs. Prints the time taken for each
+    design as it finishes and the total time at the end.
+
+    Returns the filenames of the designs that failed, because they break
+    the design rules or raised an error.
+    """
+    start = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(filename, executor.submit(build, filename, output, **options)) for filename, output in jobs]
+        for filename, f in futures:
+            try:
+                print(f"{filename}: {f.result():.3f}s", file=sys.stderr)
+            except Exception as e:
+                report_failure(filename, e)
+                failed.append(filename)
+    total = time.perf_counter() - start
+    print(f"built {len(jobs) - len(failed)} designs in {total:.3f}s", file=sys.stderr)
+    return failed
+
+def build_pdf(filenames, output, max_workers=None, **options):
+    """Builds many designs into one pdf, with a page for each design.
+
+    The pages are rendered in a pool of worker processes. The pdf is not
+    written if any of the designs fail.
+
+    Returns the filenames of the designs that failed, because they break
+    the design rules or raised an error.
+    """
+    start = time.perf_counter()
+    pages = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(filename, executor.submit(build_page, filename, **options)) for filename in filenames]
+        for filename, f in futures:
+            try:
+                page, seconds = f.result()
+            except Exception as e:
+                report_failure(filename, e)
+                failed.append(filename)
+                continue
+            print(f"{filename}: {seconds:.3f}s", file=sys.stderr)
+            if page:
+                pages.append(page)
+    if failed:
+        return failed
+    write_pdf(pages, output)
+    total = time.perf_counter() - start
+    print(f"built {len(pages)} pages in {total:.3f}s", file=sys.stderr)
+    return failed
+
+def watch(jobs, port=None, **options):
+    """Builds the designs and rebuilds them in this process whenever they
+    change, showing them in the browser.
+    """
+    from buildtools.devserver import DEFAULT_PORT, serve
+
+    outputs = {Path(filename).resolve(): output for filename, output in jobs}
+
+    def rebuild(source):
+        svg = make_svg(source, **options)
+        if svg:
+            Path(outputs[source]).write_text(svg)
+        return svg
+
+    serve(outputs, rebuild, find_local_imports, title="designs", port=port or DEFAULT_PORT,
+          restart_on=BUILD_SOURCES)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filenames", nargs="+")
+    p.add_argument("-o", "--output", help="output filename, for a single design or a pdf with all the designs")
+    p.add_argument("-d", "--output-dir", help="directory to write the files to")
+    p.add_argument("--format", choices=["svg", "pdf", "png"], default="svg")
+    p.add_argument("--dpi", type=int, default=96, help="resolution of the png images")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    p.add_argument("--compact", action="store_true", help="define repeated shapes once and round the numbers")
+    p.add_argument("--toolpath", action="store_true", help="order the shapes to keep the travel of the laser head short")
+    p.add_argument("--precision", type=int, default=3, help="digits after the decimal point with --compact or --toolpath")
+    p.add_argument("--no-drc", dest="drc", action="store_false", help="don't check the design rules")
+    p.add_argument("--min-spacing", type=float, default=MIN_SPACING, help="minimum space between holes, in mm")
+    p.add_argument("--min-clearance", type=float, default=MIN_CLEARANCE, help="minimum space between holes and the edge, in mm")
+    p.add_argument("-f", "--force", action="store_true", help="rebuild even if the output is up to date")
+    p.add_argument("--watch", action="store_true", help="rebuild the designs when they change and show them in the browser")
+    p.add_argument("--port", type=int, help="port of the browser preview with --watch")
+    args = p.parse_args()
+
+    # the helper modules like _designs.py, when the designs are given as src/*.py
+    args.filenames = [f for f in args.filenames if not Path(f).name.startswith("_")]
+    if not args.filenames:
+        p.error("no designs to build")
+
+    combined = args.output and len(args.filenames) > 1
+    if combined and args.format != "pdf":
+        p.error("-o/--output can only be used with a single design, use -d or --format pdf")
+
+    jobs = []
+    for filename in args.filenames:
+        if args.output:
+            output = args.output
+        elif args.output_dir:
+            output = str(Path(args.output_dir, Path(filename).stem + "." + args.format))
+        else:
+            output = filename.replace(".py", "." + args.format)
+        jobs.append((filename, output))
+
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    options = {"compact": args.compact, "toolpath": args.toolpath, "precision": args.precision,
+               "drc": args.drc, "min_spacing": args.min_spacing, "min_clearance": args.min_clearance}
+    formats = {"format": args.format, "dpi": args.dpi}
+    if args.watch:
+        if combined or args.format != "svg":
+            p.error("--watch only builds svg files")
+        watch(jobs, port=args.port, **options)
+        return
+
+    cache = load_cache(CACHE_FILE)
+
+    if combined:
+        key = hashlib.sha256(" ".join(compute_key(f, options | formats) for f in args.filenames).encode()).hexdigest()
+        if args.force or not Path(args.output).exists() or cache.get(args.output) != key:
+            failed = build_pdf(args.filenames, args.output, max_workers=args.jobs, **options)
+            if failed:
+                sys.exit(f"{len(failed)} designs failed: {', '.join(failed)}")
+            cache[args.output] = key
+            save_cache(CACHE_FILE, cache)
+        else:
+            print(f"{args.output} is up to date", file=sys.stderr)
+        return
+
+    keys = {output: compute_key(filename, options | formats) for filename, output in jobs}
+    if not args.force:
+        jobs = [(filename, output) for filename, output in jobs
+                if not (Path(output).exists() and cache.get(output) == keys[output])]
+        if not jobs:
+            print("all designs are up to date", file=sys.stderr)
+            return
+
+    if len(jobs) == 1:
+        try:
+            build(*jobs[0], **formats, **options)
+            failed = []
+        except DesignRuleError as e:
+            print(f"{jobs[0][0]}: {e}", file=sys.stderr)
+            failed = [jobs[0][0]]
+    else:
+        failed = build_batch(jobs, max_workers=args.jobs, **formats, **options)
 
-if SHAPES:
-    shape = joy.combine(SHAPES) | joy.scale(x=1, y=-1)
-    svg = shape.as_svg()
-    #cairosvg.svg2png(svg, write_to=args.output)
-    Path(args.output).write_text(svg)
+    for filename, output in jobs:
+        if filename not in failed:
+            cache[output] = keys[output]
+    save_cache(CACHE_FILE, cache)
+    if failed:
+        sys.exit(f"{len(failed)} designs failed: {', '.join(failed)}")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Checks the design rules for laser cutting.
+
+Usage:
+
+    python drc.py svg/*.svg [--min-spacing 1.5] [--min-clearance 2]
+
+Holes that are too close to each other or to the cut edge of the part
+burn through when they are cut. Every hole, a circle that is not an
+outline of the design, must be at least min-spacing mm away from every
+other hole and min-clearance mm away from the outlines, the red lines and
+the circles around the whole design.
+
+The holes and the outline lines are put in a grid of cells as big as the
+largest distance that can break a rule, so that only the neighbouring
+cells need to be looked at and a design with n holes is checked in close
+to linear time.
+
+build.py runs the check on every design before writing it.
+"""
+import argparse
+import math
+import sys
+
+from svgtools import mm
+from toolpath import load_cuts
+
+MIN_SPACING = 1.5
+MIN_CLEARANCE = 2
+
+class DesignRuleError(ValueError):
+    """Raised when a design breaks the design rules.
+    """
+    def __init__(self, violations):
+        self.violations = violations
+        lines = [f"{len(violations)} design rule violations"] + [f"  {v}" for v in violations[:20]]
+        if len(violations) > 20:
+            lines.append(f"  and {len(violations) - 20} more")
+        super().__init__("\n".join(lines))
+
+    def __reduce__(self):
+        # to pass the violations from the worker processes of the build
+        return self.__class__, (self.violations,)
+
+def _format_point(p):
+    return f"({p[0]/mm:.2f}, {p[1]/mm:.2f})"
+
+def segment_distance(p, a, b):
+    """Returns the distance from the point p to the line segment ab.
+    """
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length2 = dx*dx + dy*dy
+    t = 0 if length2 == 0 else max(0, min(1, ((p[0] - a[0])*dx + (p[1] - a[1])*dy) / length2))
+    return math.hypot(p[0] - a[0] - t*dx, p[1] - a[1] - t*dy)
+
+class Grid:
+    """Grid of square cells with the items that are in each of them.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.cells = {}
+
+    def cell(self, p):
+        return int(math.floor(p[0] / self.size)), int(math.floor(p[1] / self.size))
+
+    def add_point(self, i, p):
+        self.cells.setdefault(self.cell(p), []).append(i)
+
+    def add_segment(self, i, a, b):
+        """Adds the item to every cell the segment from a to b passes
+        through.
+        """
+        for cell in self.segment_cells(a, b):
+            self.cells.setdefault(cell, []).append(i)
+
+    def segment_cells(self, a, b):
+        """Returns the cells the segment from a to b passes through, found
+        by walking from cell to cell across the lines between them.
+        """
+        x, y = self.cell(a)
+        end = self.cell(b)
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        # how far along the segment, from 0 at a to 1 at b, the next lines
+        # between the cells are, and how far apart the lines are
+        tx = ((x + (dx > 0)) * self.size - a[0]) / dx if dx else math.inf
+        ty = ((y + (dy > 0)) * self.size - a[1]) / dy if dy else math.inf
+        delta_x = self.size / abs(dx) if dx else math.inf
+        delta_y = self.size / abs(dy) if dy else math.inf
+
+        cells = {(x, y), end}
+        for _ in range(abs(end[0] - x) + abs(end[1] - y)):
+            if tx < ty:
+                x, tx = x + step_x, tx + delta_x
+            else:
+                y, ty = y + step_y, ty + delta_y
+            cells.add((x, y))
+        return cells
+
+    def near(self, p):
+        """Returns the items in the cell of p and the ones around it.
+        """
+        cx, cy = self.cell(p)
+        found = []
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                found.extend(self.cells.get((x, y), ()))
+        return found
+
+def check_cuts(cuts, min_spacing=MIN_SPACING, min_clearance=MIN_CLEARANCE):
+    """Returns the list of design rule violations in the cuts, as
+    messages with the positions in mm.
+    """
+    if not cuts:
+        return []
+    points = [p for cut in cuts for p in cut.points]
+    bounds = (min(x for x, y in points), min(y for x, y in points),
+              max(x for x, y in points), max(y for x, y in points))
+    holes = [cut for cut in cuts if cut.tag == "circle" and not cut.is_outline(bounds)]
+    outlines = [cut for cut in cuts if cut.is_outline(bounds)]
+    if not holes:
+        return []
+
+    spacing, clearance = min_spacing * mm, min_clearance * mm
+    max_r = max(hole.r for hole in holes)
+    # a hole can only break a rule with the ones in the cells around it
+    grid = Grid(max(2*max_r + spacing, max_r + clearance, 1e-6))
+
+    violations = []
+    for i, hole in enumerate(holes):
+        c = hole.points[0]
+        for j in grid.near(c):
+            other = holes[j]
+            gap = math.dist(c, other.points[0]) - hole.r - other.r
+            if gap < spacing - 1e-9:
+                violations.append(f"holes at {_format_point(other.points[0])} and {_format_point(c)} "
+                                  f"are {gap/mm:.2f}mm apart, less than {min_spacing}mm")
+        grid.add_point(i, c)
+
+    lines = Grid(grid.size)
+    for i, cut in enumerate(outlines):
+        if cut.tag == "line":
+            lines.add_segment(i, *cut.points)
+    circles = [cut for cut in outlines if cut.tag == "circle"]
+
+    for hole in holes:
+        c = hole.points[0]
+        gaps = [segment_distance(c, *outlines[i].points) - hole.r for i in set(lines.near(c))]
+        gaps += [abs(math.dist(c, circle.points[0]) - circle.r) - hole.r for circle in circles]
+        gap = min(gaps, default=math.inf)
+        if gap < clearance - 1e-9:
+            violations.append(f"hole at {_format_point(c)} is {gap/mm:.2f}mm from the edge, "
+                              f"less than {min_clearance}mm")
+    return violations
+
+def check_svg(svg, min_spacing=MIN_SPACING, min_clearance=MIN_CLEARANCE):
+    """Checks the design rules of the svg and raises DesignRuleError if
+    any of them is broken.
+    """
+    violations = check_cuts(load_cuts(svg), min_spacing=min_spacing, min_clearance=min_clearance)
+    if violations:
+        raise DesignRuleError(violations)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filenames", nargs="+")
+    p.add_argument("--min-spacing", type=float, default=MIN_SPACING, help="minimum space between holes, in mm")
+    p.add_argument("--min-clearance", type=float, default=MIN_CLEARANCE, help="minimum space between holes and the edge, in mm")
+    args = p.parse_args()
+
+    failed = False
+    for filename in args.filenames:
+        try:
+            check_svg(open(filename).read(), min_spacing=args.min_spacing, min_clearance=args.min_clearance)
+            print(f"{filename}: ok")
+        except DesignRuleError as e:
+            print(f"{filename}: {e}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Exports the svg of the designs to pdf and png.
+
+The pdf is written directly from the shapes, as vector paths, without
+going through cairo or any other library. A pdf can have many pages, one
+for each design or sheet. The png is drawn using Pillow, which is only
+needed when exporting to png.
+
+The svg can be any of the ones written by build.py or nest.py. Circles,
+ellipses, lines, rectangles, polylines and polygons are supported.
+"""
+import math
+import re
+import xml.etree.ElementTree as ET
+import zlib
+
+from svgtools import flatten, format_number, multiply
+
+# points per unit of the svg width and height attributes
+UNITS = {
+    "": 72/96,
+    "px": 72/96,
+    "pt": 1,
+    "mm": 72/25.4,
+    "cm": 72/2.54,
+    "in": 72,
+}
+
+COLORS = {
+    "black": (0, 0, 0),
+    "white": (1, 1, 1),
+    "red": (1, 0, 0),
+    "green": (0, 0.5, 0),
+    "blue": (0, 0, 1),
+}
+
+# control point distance for drawing a quarter circle with a bezier curve
+KAPPA = 4 * (math.sqrt(2) - 1) / 3
+
+def parse_length(text):
+    """Returns a length like "297mm" in points.
+    """
+    match = re.fullmatch(r"\s*([-+0-9.eE]+)\s*([a-z]*)\s*", text)
+    if not match or match.group(2) not in UNITS:
+        raise ValueError(f"Unsupported length: {text!r}")
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+def parse_color(text):
+    """Returns the color as an (r, g, b) tuple of values between 0 and 1,
+    or None for "none".
+    """
+    text = (text or "none").strip().lower()
+    if text in ("none", "transparent"):
+        return None
+    if text in COLORS:
+        return COLORS[text]
+    if text.startswith("#") and len(text) in (4, 7):
+        digits = text[1:] if len(text) == 7 else "".join(c*2 for c in text[1:])
+        return tuple(int(digits[i:i+2], 16) / 255 for i in (0, 2, 4))
+    raise ValueError(f"Unsupported color: {text!r}")
+
+class Page:
+    """A page of the pdf, made from an svg image.
+
+    The size of the page comes from the width and height of the svg, in
+    points, and the viewBox is stretched to fill the page.
+    """
+    def __init__(self, svg):
+        root = ET.fromstring(svg)
+        self.width = parse_length(root.get("width", "300"))
+        self.height = parse_length(root.get("height", "300"))
+        x, y, w, h = [float(v) for v in root.get("viewBox", f"0 0 {root.get('width', 300)} {root.get('height', 300)}").split()]
+
+        # svg has y growing downwards and pdf upwards
+        sx, sy = self.width / w, self.height / h
+        self.matrix = (sx, 0.0, 0.0, -sy, -x * sx, self.height + y * sy)
+        self.shapes = flatten(svg)
+
+    def content(self):
+        """Returns the drawing operators of the page.
+        """
+        ops = []
+        for tag, attrs, m in self.shapes:
+            stroke = parse_color(attrs.get("stroke"))
+            fill = parse_color(attrs.get("fill", "black"))
+            if stroke is None and fill is None:
+                continue
+
+            ops.append("q")
+            ops.append(" ".join(_number(v) for v in multiply(self.matrix, m)) + " cm")
+            if stroke is not None:
+                ops.append(" ".join(_number(v) for v in stroke) + " RG")
+                ops.append(_number(float(attrs.get("stroke-width", 1))) + " w")
+            if fill is not None:
+                ops.append(" ".join(_number(v) for v in fill) + " rg")
+            ops.extend(path_operators(tag, attrs))
+            if stroke is not None and fill is not None:
+                ops.append("B")
+            elif stroke is not None:
+                ops.append("S")
+            else:
+                ops.append("f")
+            ops.append("Q")
+        return "\n".join(ops).encode()
+
+def _number(value):
+    return format_number(value, 4)
+
+def _ellipse_operators(cx, cy, rx, ry):
+    kx, ky = rx * KAPPA, ry * KAPPA
+    p = _number
+    return [
+        f"{p(cx + rx)} {p(cy)} m",
+        f"{p(cx + rx)} {p(cy + ky)} {p(cx + kx)} {p(cy + ry)} {p(cx)} {p(cy + ry)} c",
+        f"{p(cx - kx)} {p(cy + ry)} {p(cx - rx)} {p(cy + ky)} {p(cx - rx)} {p(cy)} c",
+        f"{p(cx - rx)} {p(cy - ky)} {p(cx - kx)} {p(cy - ry)} {p(cx)} {p(cy - ry)} c",
+        f"{p(cx + kx)} {p(cy - ry)} {p(cx + rx)} {p(cy - ky)} {p(cx + rx)} {p(cy)} c",
+        "h",
+    ]
+
+def _points(text):
+    values = [float(v) for v in re.split(r"[\s,]+", text.strip()) if v]
+    return list(zip(values[::2], values[1::2]))
+
+def path_operators(tag, attrs):
+    """Returns the pdf path operators for a shape, in its own coordinates.
+    """
+    def get(name):
+        return float(attrs.get(name, 0))
+
+    if tag == "circle":
+        return _ellipse_operators(get("cx"), get("cy"), get("r"), get("r"))
+    elif tag == "ellipse":
+        return _ellipse_operators(get("cx"), get("cy"), get("rx"), get("ry"))
+    elif tag == "line":
+        return [f"{_number(get('x1'))} {_number(get('y1'))} m", f"{_number(get('x2'))} {_number(get('y2'))} l"]
+    elif tag == "rect":
+        return [f"{_number(get('x'))} {_number(get('y'))} {_number(get('width'))} {_number(get('height'))} re"]
+    elif tag in ("polyline", "polygon"):
+        points = _points(attrs.get("points", ""))
+        ops = [f"{_number(x)} {_number(y)} {'m' if i == 0 else 'l'}" for i, (x, y) in enumerate(points)]
+        if tag == "polygon":
+            ops.append("h")
+        return ops
+    raise ValueError(f"Can't export <{tag}> to pdf")
+
+def write_pdf(pages, path):
+    """Writes the pages to a pdf file.
+
+    The pages are (width, height, content) tuples, with the content being
+    the drawing operators returned by Page.content().
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # the page tree, filled in below
+    ]
+    kids = []
+    for width, height, content in pages:
+        page_id = len(objects) + 1
+        kids.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_number(width)} {_number(height)}] "
+            f"/Contents {page_id + 1} 0 R /Resources << >> >>".encode())
+        data = zlib.compress(content)
+        objects.append(f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode() + data + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+def pdf_page(svg):
+    """Returns the (width, height, content) of the pdf page for an svg.
+    """
+    page = Page(svg)
+    return page.width, page.height, page.content()
+
+def write_png(svg, path, dpi=96, antialias=4):
+    """Draws the svg as a png image with the given resolution.
+
+    The image is drawn antialias times bigger and scaled down, to smooth
+    the edges.
+    """
+    from PIL import Image, ImageDraw
+
+    page = Page(svg)
+    scale = dpi / 72 * antialias
+    width, height = round(page.width * dpi / 72), round(page.height * dpi / 72)
+    image = Image.new("RGB", (width * antialias, height * antialias), "white")
+    draw = ImageDraw.Draw(image)
+
+    # same as the pdf, without flipping the y axis
+    a, b, c, d, e, f = page.matrix
+    to_image = (a * scale, 0.0, 0.0, -d * scale, e * scale, (page.height - f) * scale)
+
+    def color(rgb):
+        return None if rgb is None else tuple(round(v * 255) for v in rgb)
+
+    for tag, attrs, m in page.shapes:
+        m = multiply(to_image, m)
+        scale_m = math.sqrt(abs(m[0]*m[3] - m[1]*m[2]))
+        stroke = color(parse_color(attrs.get("stroke")))
+        fill = color(parse_color(attrs.get("fill", "black")))
+        width_px = max(1, round(float(attrs.get("stroke-width", 1)) * scale_m))
+
+        points = _shape_points(tag, attrs, scale_m)
+        points = [(m[0]*x + m[2]*y + m[4], m[1]*x + m[3]*y + m[5]) for x, y in points]
+        if tag == "line" or tag == "polyline":
+            if stroke:
+                draw.line(points, fill=stroke, width=width_px)
+        else:
+            draw.polygon(points, fill=fill)
+            if stroke:
+                draw.line(points + points[:1], fill=stroke, width=width_px, joint="curve")
+
+    image = image.resize((width, height), Image.LANCZOS)
+    image.save(path, dpi=(dpi, dpi))
+
+def _shape_points(tag, attrs, scale):
+    """Returns the outline of a shape as a list of points, in its own
+    coordinates.
+
+    Circles and ellipses get more points the bigger they are drawn, which
+    is given by the scale.
+    """
+    def get(name):
+        return float(attrs.get(name, 0))
+
+    if tag in ("circle", "ellipse"):
+        rx = get("r") if tag == "circle" else get("rx")
+        ry = get("r") if tag == "circle" else get("ry")
+        segments = min(max(16, round(8 * math.sqrt(max(rx, ry) * scale))), 1024)
+        return [(get("cx") + rx * math.cos(2*math.pi*i/segments), get("cy") + ry * math.sin(2*math.pi*i/segments))
+                for i in range(segments)]
+    elif tag == "line":
+        return [(get("x1"), get("y1")), (get("x2"), get("y2"))]
+    elif tag == "rect":
+        x, y, w, h = get("x"), get("y"), get("width"), get("height")
+        return [(x, y), (x + w, y), (x + w, y + h), (x, y + h)]
+    elif tag in ("polyline", "polygon"):
+        return _points(attrs.get("points", ""))
+    raise ValueError(f"Can't export <{tag}> to png")
@@ -0,0 +1,386 @@
+"""Packs the designs onto A4 sheets for laser cutting.
+
+Usage:
+
+    python nest.py hexagon:4 flower:7 square:2 [-o sheets] [--pdf]
+
+Takes the built svg files of the designs from svg/ along with the number
+of copies of each and packs them onto as few sheets as possible. Every
+design is packed using its bounding shape: a circle for the round designs
+and a rectangle, that may be turned by 90 degrees, for the others. The
+biggest designs are placed first, each at the top-left most position
+where it fits, and the smaller ones fill the gaps that are left.
+
+The positions tried are either the ones touching the edges and the parts
+already placed, which nests round parts into each other, or only the ones
+next to their bounding boxes, which lines them up in rows. Both are tried
+and the one that needs fewer sheets is used.
+
+Writes one svg file per sheet, with every shape at its final position so
+that the laser cutter software doesn't have to resolve any references,
+and reports the material used on each sheet. With --pdf, all the sheets
+are also written to sheets.pdf, one sheet per page.
+"""
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+from export import pdf_page, write_pdf
+from svgtools import (flatten, format_number, geometry, mm, multiply, render_shape,
+                      rotation, translation)
+
+SHEET_SIZES = {
+    "a4": (297, 210),
+    "a3": (420, 297),
+}
+
+# round designs are packed as circles when the circle around them is not
+# much bigger than the design itself
+ROUNDNESS = 0.85
+
+EPSILON = 1e-6
+
+class Part:
+    """A design to be packed, with its outline in mm.
+
+    The bounding shape is a circle of radius r around (cx, cy) when kind
+    is "circle", or the rectangle of size w x h with its centre at (cx, cy)
+    otherwise.
+    """
+    def __init__(self, name, svg):
+        self.name = name
+        self.shapes = flatten(svg)
+
+        points = []
+        for tag, attrs, m in self.shapes:
+            g = geometry(tag, attrs, m)
+            if tag == "circle":
+                cx, cy, r = g
+                points += [(cx + r*math.cos(t), cy + r*math.sin(t))
+                           for t in (i * math.pi/16 for i in range(32))]
+            elif tag == "line":
+                points += [g[:2], g[2:]]
+        if not points:
+            raise ValueError(f"{name} has no circles or lines to cut")
+        points = [(x/mm, y/mm) for x, y in points]
+
+        xs = [x for x, y in points]
+        ys = [y for x, y in points]
+        self.cx = (min(xs) + max(xs)) / 2
+        self.cy = (min(ys) + max(ys)) / 2
+        self.w = max(xs) - min(xs)
+        self.h = max(ys) - min(ys)
+        self.r = max(math.hypot(x - self.cx, y - self.cy) for x, y in points)
+        self.area = polygon_area(convex_hull(points))
+
+        if math.pi * self.r**2 * ROUNDNESS <= self.area:
+            self.kind = "circle"
+        else:
+            self.kind = "rect"
+
+    def __repr__(self):
+        return f"<Part {self.name} {self.kind} {self.w:.1f}x{self.h:.1f}mm>"
+
+def convex_hull(points):
+    """Returns the convex hull of the points, using the monotone chain
+    algorithm.
+    """
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    def half(points):
+        hull = []
+        for p in points:
+            while len(hull) >= 2 and cross(hull[-2], hull[-1], p) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull[:-1]
+
+    return half(points) + half(points[::-1])
+
+def polygon_area(points):
+    n = len(points)
+    return abs(sum(points[i][0] * points[(i+1) % n][1] - points[(i+1) % n][0] * points[i][1]
+                   for i in range(n))) / 2
+
+class Placement:
+    """A part placed on a sheet.
+
+    x and y are the centre of the bounding shape on the sheet and
+    rotation is 0 or 90 degrees. The size of the bounding shape includes
+    half the gap between parts on every side.
+    """
+    def __init__(self, part, x, y, rotation, gap):
+        self.part = part
+        self.x = x
+        self.y = y
+        self.rotation = rotation
+        if part.kind == "circle":
+            self.r = part.r + gap/2
+        else:
+            w, h = (part.w, part.h) if rotation == 0 else (part.h, part.w)
+            self.w = w + gap
+            self.h = h + gap
+
+    @property
+    def kind(self):
+        return self.part.kind
+
+    def bounds(self):
+        if self.kind == "circle":
+            return self.x - self.r, self.y - self.r, self.x + self.r, self.y + self.r
+        return self.x - self.w/2, self.y - self.h/2, self.x + self.w/2, self.y + self.h/2
+
+    def overlaps(self, other):
+        if self.kind == "circle" and other.kind == "circle":
+            return math.hypot(self.x - other.x, self.y - other.y) < self.r + other.r - EPSILON
+        if self.kind == "rect" and other.kind == "rect":
+            x1, y1, x2, y2 = self.bounds()
+            u1, v1, u2, v2 = other.bounds()
+            return x1 < u2 - EPSILON and u1 < x2 - EPSILON and y1 < v2 - EPSILON and v1 < y2 - EPSILON
+        circle, rect = (self, other) if self.kind == "circle" else (other, self)
+        x1, y1, x2, y2 = rect.bounds()
+        dx = max(x1 - circle.x, 0, circle.x - x2)
+        dy = max(y1 - circle.y, 0, circle.y - y2)
+        return math.hypot(dx, dy) < circle.r - EPSILON
+
+    def matrix(self):
+        """Returns the transform that moves the design to its place on the
+        sheet, in the units of the design.
+        """
+        m = multiply(rotation(self.rotation), translation(-self.part.cx * mm, -self.part.cy * mm))
+        return multiply(translation(self.x * mm, self.y * mm), m)
+
+class Sheet:
+    """A sheet of the given size with the parts placed on it.
+
+    The parts are kept margin mm away from the edges and gap mm away from
+    each other.
+    """
+    def __init__(self, width, height, margin, gap, nested=True):
+        self.width = width
+        self.height = height
+        self.gap = gap
+        self.nested = nested
+        # the bounding shapes include half the gap
+        self.left = self.top = margin - gap/2
+        self.right = width - margin + gap/2
+        self.bottom = height - margin + gap/2
+        self.placements = []
+
+    def utilisation(self):
+        return sum(p.part.area for p in self.placements) / (self.width * self.height)
+
+    def place(self, part):
+        """Places the part at the top-left most free position on the sheet.
+
+        Returns the placement or None if the part doesn't fit.
+        """
+        rotations = [0] if part.kind == "circle" else [0, 90]
+        best = None
+        for rot in rotations:
+            p = Placement(part, 0, 0, rot, self.gap)
+            for x, y in self._candidates(p):
+                if best is not None and (y, x) >= (best.y, best.x):
+                    continue
+                p.x, p.y = x, y
+                if self._fits(p):
+                    best = Placement(part, x, y, rot, self.gap)
+        if best is not None:
+            self.placements.append(best)
+        return best
+
+    def _fits(self, p):
+        x1, y1, x2, y2 = p.bounds()
+        if (x1 < self.left - EPSILON or y1 < self.top - EPSILON
+                or x2 > self.right + EPSILON or y2 > self.bottom + EPSILON):
+            return False
+        return not any(p.overlaps(q) for q in self.placements)
+
+    def _candidates(self, p):
+        """Returns the positions where the part would touch the edges of
+        the sheet or the parts already placed.
+        """
+        if p.kind == "circle" and self.nested:
+            return self._circle_candidates(p.r)
+        elif p.kind == "circle":
+            return self._rect_candidates(2*p.r, 2*p.r)
+        return self._rect_candidates(p.w, p.h)
+
+    def _rect_candidates(self, w, h):
+        xs = {self.left, self.right - w}
+        ys = {self.top, self.bottom - h}
+        for q in self.placements:
+            x1, y1, x2, y2 = q.bounds()
+            xs.update([x2, x1 - w])
+            ys.update([y2, y1 - h])
+
+        candidates = {(x, y) for x in xs for y in ys}
+        # below or beside the round parts, where they curve away
+        for q in self.placements:
+            if q.kind != "circle" or not self.nested:
+                continue
+            for x in xs:
+                dx = max(x - q.x, 0, q.x - (x + w))
+                if dx < q.r:
+                    dy = math.sqrt(q.r**2 - dx**2)
+                    candidates.update([(x, q.y + dy), (x, q.y - dy - h)])
+        # candidates are for the top-left corner, return the centres
+        return [(x + w/2, y + h/2) for x, y in candidates]
+
+    def _circle_candidates(self, r):
+        left, top = self.left + r, self.top + r
+        right, bottom = self.right - r, self.bottom - r
+        candidates = {(left, top), (right, top), (left, bottom), (right, bottom)}
+
+        circles = [(q.x, q.y, q.r + r) for q in self.placements if q.kind == "circle"]
+        for q in self.placements:
+            if q.kind == "rect":
+                x1, y1, x2, y2 = q.bounds()
+                # next to the sides and touching the corners of the rectangle
+                for x in (x1 - r, x2 + r):
+                    candidates.update([(x, top), (x, bottom), (x, y1 + r), (x, y2 - r)])
+                for y in (y1 - r, y2 + r):
+                    candidates.update([(left, y), (right, y), (x1 + r, y), (x2 - r, y)])
+                for cx in (x1, x2):
+                    for cy in (y1, y2):
+                        circles.append((cx, cy, r))
+
+        # touching a part and one of the edges
+        for cx, cy, d in circles:
+            for x in (left, right):
+                if abs(x - cx) <= d:
+                    dy = math.sqrt(d**2 - (x - cx)**2)
+                    candidates.update([(x, cy - dy), (x, cy + dy)])
+            for y in (top, bottom):
+                if abs(y - cy) <= d:
+                    dx = math.sqrt(d**2 - (y - cy)**2)
+                    candidates.update([(cx - dx, y), (cx + dx, y)])
+
+        # touching two parts
+        for i, c1 in enumerate(circles):
+            for c2 in circles[i+1:]:
+                candidates.update(circle_intersections(c1, c2))
+        return candidates
+
+def circle_intersections(c1, c2):
+    """Returns the points where two circles, given as (x, y, r), meet.
+    """
+    x1, y1, r1 = c1
+    x2, y2, r2 = c2
+    d = math.hypot(x2 - x1, y2 - y1)
+    if d == 0 or d > r1 + r2 or d < abs(r1 - r2):
+        return []
+    a = (r1**2 - r2**2 + d**2) / (2*d)
+    h = math.sqrt(max(r1**2 - a**2, 0))
+    xm = x1 + a * (x2 - x1) / d
+    ym = y1 + a * (y2 - y1) / d
+    return [
+        (xm + h * (y2 - y1) / d, ym - h * (x2 - x1) / d),
+        (xm - h * (y2 - y1) / d, ym + h * (x2 - x1) / d),
+    ]
+
+def pack(parts, width, height, margin=5, gap=2):
+    """Packs the parts onto as few sheets of width x height mm as possible.
+
+    Returns the list of sheets.
+    """
+    results = [_pack(parts, width, height, margin, gap, nested) for nested in (True, False)]
+    # fewer sheets, and then the emptiest last sheet, to keep the most
+    # material in one piece
+    return min(results, key=lambda sheets: (len(sheets), sheets[-1].utilisation()))
+
+def _pack(parts, width, height, margin, gap, nested):
+    sheets = []
+    for part in sorted(parts, key=lambda p: p.area, reverse=True):
+        for sheet in sheets:
+            if sheet.place(part):
+                break
+        else:
+            sheet = Sheet(width, height, margin, gap, nested)
+            if not sheet.place(part):
+                raise ValueError(f"{part.name} doesn't fit on a {width}x{height} mm sheet")
+            sheets.append(sheet)
+    return sheets
+
+def render_sheet(sheet, precision=3):
+    """Renders a sheet as svg, with every shape at its final position.
+    """
+    lines = [
+        f'<svg width="{sheet.width}mm" height="{sheet.height}mm" '
+        f'viewBox="0 0 {format_number(sheet.width*mm, precision)} {format_number(sheet.height*mm, precision)}" '
+        f'fill="none" stroke="black" xmlns="http://www.w3.org/2000/svg">'
+    ]
+    for p in sheet.placements:
+        lines.append(f'<g id="{p.part.name}-{sheet.placements.index(p) + 1}">')
+        placement = p.matrix()
+        for tag, attrs, m in p.part.shapes:
+            lines.append(render_shape(tag, attrs, multiply(placement, m), precision))
+        lines.append("</g>")
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
+
+def parse_item(text):
+    """Parses a design:count argument.
+    """
+    name, _, count = text.partition(":")
+    return name, int(count or 1)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("items", nargs="+", metavar="design:count",
+                   help="name of the design in svg/ or path to its svg file, and the number of copies")
+    p.add_argument("-o", "--output-dir", default="sheets", help="directory to write the sheets to")
+    p.add_argument("--sheet", choices=SHEET_SIZES, default="a4", help="size of the sheets, in landscape")
+    p.add_argument("--margin", type=float, default=5, help="space to leave at the edges, in mm")
+    p.add_argument("--gap", type=float, default=2, help="space to leave between the parts, in mm")
+    p.add_argument("--pdf", action="store_true", help="also write all the sheets to sheets.pdf")
+    args = p.parse_args()
+
+    start = time.perf_counter()
+    parts = []
+    for item in args.items:
+        name, count = parse_item(item)
+        path = Path(name) if name.endswith(".svg") else Path("svg", name + ".svg")
+        if not path.exists():
+            p.error(f"{path} not found, build the design first")
+        part = Part(path.stem, path.read_text())
+        parts += [part] * count
+
+    width, height = SHEET_SIZES[args.sheet]
+    try:
+        sheets = pack(parts, width, height, margin=args.margin, gap=args.gap)
+    except ValueError as e:
+        p.error(str(e))
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pages = []
+    for i, sheet in enumerate(sheets, start=1):
+        svg = render_sheet(sheet)
+        path = output_dir / f"sheet-{i}.svg"
+        path.write_text(svg)
+        if args.pdf:
+            pages.append(pdf_page(svg))
+
+        counts = {}
+        for placement in sheet.placements:
+            counts[placement.part.name] = counts.get(placement.part.name, 0) + 1
+        summary = ", ".join(f"{name} x{n}" for name, n in counts.items())
+        print(f"{path}: {sheet.utilisation():5.1%} used  {summary}")
+
+    if pages:
+        write_pdf(pages, output_dir / "sheets.pdf")
+
+    total = sum(s.utilisation() for s in sheets) / len(sheets)
+    print(f"{len(parts)} parts on {len(sheets)} sheets, {total:.1%} used, "
+          f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,12 @@
 from joy import *
+import functools
+import hashlib
+import inspect
+import logging
 import math
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
 
 # mm to pixels in inkscape units
 mm = 300/79.375
@@ -10,31 +17,123 @@ HOLE_LENGTH = 4*mm
 def cycle(n):
     return repeat(n, rotate(360/n))
 
+def cached(f):
+    """Caches the shapes made by f, keyed on its arguments by name.
+
+    The same shape is returned for the same arguments, whether they are
+    passed by position or by name, so it is shared by everything that uses
+    it. It is frozen: its attributes and children can't be changed, so
+    use joy's transforms and + to make new shapes from it instead.
+
+    The ids of the shape and of the ones repeated inside it are given when
+    it is made, from the function name and a hash of the arguments, so that
+    they are the same whatever designs were built before it and in every
+    process. A shape made by a cached function can be passed to another
+    one and is hashed by its id.
+    """
+    signature = inspect.signature(f)
+    cache = {}
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(sorted((name, _cache_key(value)) for name, value in bound.arguments.items()))
+        if key not in cache:
+            shape = f(*args, **kwargs)
+            digest = hashlib.sha1(repr(key).encode()).hexdigest()[:8]
+            _freeze(shape, f"{f.__name__.removeprefix('make_')}-{digest}")
+            cache[key] = shape
+        return cache[key]
+
+    wrapper.cache = cache
+    return wrapper
+
+def _is_frozen(shape):
+    return isinstance(shape.attrs, MappingProxyType)
+
+def _cache_key(value):
+    """Returns the value to key the cache on, which is the id for a shape
+    made by a cached function.
+    """
+    if isinstance(value, Shape):
+        if not _is_frozen(value):
+            raise TypeError("only the shapes made by the cached functions can be passed to them")
+        return ("shape", value.attrs["id"])
+    return value
+
+def _freeze(shape, name):
+    """Renames the ids given by joy's counter in shape to ones starting
+    with name, gives the shape itself an id, so that repeating it later
+    doesn't change it, and makes the attributes and children of all the
+    shapes in it read-only.
+
+    The frozen shapes inside it, made by other cached functions, are left
+    as they are.
+    """
+    ids = {}
+
+    def nodes(node):
+        if _is_frozen(node):
+            return
+        yield node
+        for child in node.children or []:
+            yield from nodes(child)
+
+    for node in nodes(shape):
+        id = node.attrs.get("id")
+        if id and id.startswith("s-"):
+            node.attrs["id"] = ids.setdefault(id, f"{name}-{len(ids)}")
+    for node in nodes(shape):
+        href = node.attrs.get("xlink:href", "")
+        if href[1:] in ids:
+            node.attrs["xlink:href"] = "#" + ids[href[1:]]
+    shape.attrs.setdefault("id", name)
+
+    for node in list(nodes(shape)):
+        if not _is_frozen(node):
+            node.attrs = MappingProxyType(node.attrs)
+            node.children = node.children and tuple(node.children)
+
+def clear_caches():
+    for f in (make_hole, make_hole_row, make_polygon):
+        f.cache.clear()
+
+@cached
 def make_hole(hole_radius, hole_length):
     y = hole_radius + hole_length
     return line(x1=0, y1=0, x2=0, y2=hole_length, stroke="black") + circle(x=0, y=y, r=hole_radius, stroke="black", fill="none")
 
-
+@cached
 def make_hole_row(hole, n, length, gap):
     step = length / (n-1+2*gap)
     row0 = hole | repeat(n, translate(step))
     row = row0 | translate(x=-length/2+gap*step)
     return row
 
+@cached
 def make_polygon(n, side_length, num_holes, hole_radius=HOLE_RADIUS, hole_length=HOLE_LENGTH, gap_in_steps=1.5):
-    print("make_polygon", n, side_length)
     side0 = line(x1=-side_length/2, y1=0, x2=side_length/2, y2=0, stroke="red")
     hole = make_hole(hole_radius=hole_radius, hole_length=hole_length)
     row = make_hole_row(hole, num_holes, side_length, gap=gap_in_steps)
 
     # height from origin
     angle = 2*math.pi/n
-    print("angle", math.degrees(angle))
     d = side_length/2 / math.tan(angle/2)
-
-    print("side_length", side_length)
-    print("d", d)
+    logger.debug(f"make_polygon n={n} side_length={side_length:.3f} angle={math.degrees(angle):.1f} d={d:.3f}")
 
     side = (side0 + row) | translate(y=-d)
 
-    return side | cycle(n)
\ No newline at end of file
+    return side | cycle(n)
+
+def make_concentric_circles(n, inner_n=None, hole_radius=3, size=90*mm):
+    """Two rings of holes inside a circle, with n holes in the outer ring
+    and inner_n, same as n by default, in the inner one.
+    """
+    border = circle(r=150)
+    hole = circle(r=hole_radius)
+    outer_holes = hole | translate(x=135) | cycle(n)
+    inner_holes = hole | translate(x=135/2) | cycle(inner_n or n)
+
+    shape = Group([border, outer_holes, inner_holes], stroke="black", fill="none", stroke_width=0.75)
+    return shape | scale(size/300)
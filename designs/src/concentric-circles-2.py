@@ -1,17 +1,5 @@
 from joy import *
+from _designs import make_concentric_circles
 
-# mm to pixels in inkscape units
-mm = 300/79.375
-
-scale_factor = 90*mm/300
-
-r = circle(r=150)
-
-hole = circle(r=3)
-
-holes1 = hole | translate(x=135) | repeat(72, rotate(5))
-
-holes2 = hole | translate(x=135/2) | repeat(36, rotate(10))
-
-shape = Group([r, holes1, holes2], stroke="black", fill="none", stroke_width=0.75)
-show(shape | scale(scale_factor))
\ No newline at end of file
+shape = make_concentric_circles(n=72, inner_n=36)
+show(shape)
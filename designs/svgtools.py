@@ -0,0 +1,344 @@
+"""Tools to work with the svg files of the designs.
+
+The svg generated by joy wraps every copy made by repeat in one more
+nested group, so a row of holes is as deep as it is long and most of the
+file is indentation and repeated transforms. compact_svg rewrites such a
+file with a single <defs> section, flat <use> references with one
+combined transform each, and all the numbers rounded to a given
+precision.
+
+flatten resolves all the groups, references and transforms of an svg
+file and returns the shapes with their absolute coordinates.
+"""
+import math
+import re
+import xml.etree.ElementTree as ET
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+HREF = f"{{{XLINK_NS}}}href"
+
+# mm to pixels in inkscape units, the same as mm in src/_designs.py
+mm = 300/79.375
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# attributes that are inherited by the children of a group
+STYLE_ATTRS = {"stroke", "fill", "stroke-width", "stroke-linecap", "stroke-dasharray"}
+
+# attributes that hold a single number
+NUMERIC_ATTRS = {"x", "y", "cx", "cy", "r", "rx", "ry", "x1", "y1", "x2", "y2", "width", "height", "stroke-width"}
+
+def multiply(m1, m2):
+    """Returns the matrix that applies m2 first and then m1.
+
+    Matrices are (a, b, c, d, e, f) tuples, as in the svg matrix() transform.
+    """
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1*a2 + c1*b2,
+        b1*a2 + d1*b2,
+        a1*c2 + c1*d2,
+        b1*c2 + d1*d2,
+        a1*e2 + c1*f2 + e1,
+        b1*e2 + d1*f2 + f1,
+    )
+
+def apply(m, x, y):
+    a, b, c, d, e, f = m
+    return a*x + c*y + e, b*x + d*y + f
+
+def translation(x, y):
+    return (1.0, 0.0, 0.0, 1.0, x, y)
+
+def rotation(angle, cx=0.0, cy=0.0):
+    t = math.radians(angle)
+    cos, sin = math.cos(t), math.sin(t)
+    m = (cos, sin, -sin, cos, 0.0, 0.0)
+    if cx or cy:
+        m = multiply(translation(cx, cy), multiply(m, translation(-cx, -cy)))
+    return m
+
+def scaling(sx, sy=None):
+    return (sx, 0.0, 0.0, sx if sy is None else sy, 0.0, 0.0)
+
+_TRANSFORM_RE = re.compile(r"(matrix|translate|rotate|scale)\s*\(([^)]*)\)")
+
+def parse_transform(text):
+    """Parses the value of a transform attribute into a matrix.
+    """
+    m = IDENTITY
+    for name, args in _TRANSFORM_RE.findall(text or ""):
+        values = [float(v) for v in re.split(r"[\s,]+", args.strip())]
+        if name == "matrix":
+            t = tuple(values)
+        elif name == "translate":
+            t = translation(values[0], values[1] if len(values) > 1 else 0.0)
+        elif name == "rotate":
+            t = rotation(*values)
+        else:
+            t = scaling(*values)
+        m = multiply(m, t)
+    return m
+
+def is_rigid(m, tolerance=1e-9):
+    """Tells if the matrix only rotates and moves the shapes, without
+    scaling or skewing them.
+    """
+    a, b, c, d, e, f = m
+    return (abs(a*a + b*b - 1) < tolerance and abs(c*c + d*d - 1) < tolerance
+            and abs(a*c + b*d) < tolerance and a*d - b*c > 0)
+
+def format_number(value, precision):
+    """Formats a number with at most precision digits after the decimal point.
+    """
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+def format_attr(name, value, precision):
+    """Formats the value of an attribute, rounding it when it is a number.
+    """
+    if isinstance(value, float):
+        return format_number(value, precision)
+    if name in NUMERIC_ATTRS:
+        try:
+            return format_number(float(value), precision)
+        except ValueError:
+            pass
+    return value
+
+def format_transform(m, precision):
+    """Formats a matrix as a transform attribute, using translate, rotate
+    and scale when possible. Returns None for the identity.
+
+    The angles and scale factors are kept with 3 more digits than the
+    coordinates, as their errors grow with the distance from the origin.
+    """
+    a, b, c, d, e, f = m
+    scale = math.sqrt(abs(a*d - b*c))
+    parts = []
+    if abs(e) > 0.1**precision or abs(f) > 0.1**precision:
+        parts.append(f"translate({format_number(e, precision)} {format_number(f, precision)})")
+    if scale and is_rigid((a/scale, b/scale, c/scale, d/scale, 0, 0)):
+        angle = math.degrees(math.atan2(b, a))
+        if format_number(angle, precision + 3) != "0":
+            parts.append(f"rotate({format_number(angle, precision + 3)})")
+        if abs(scale - 1) > 0.1**(precision + 3):
+            parts.append(f"scale({format_number(scale, precision + 3)})")
+    else:
+        values = [format_number(v, precision + 3) for v in (a, b, c, d)] + [format_number(e, precision), format_number(f, precision)]
+        parts = [f"matrix({' '.join(values)})"]
+    return " ".join(parts) or None
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def _attrs(elem):
+    """Returns the attributes of an element with the namespaces removed,
+    except for the transform.
+    """
+    return {local_name(k): v for k, v in elem.attrib.items() if k not in ("transform", HREF)}
+
+def _find_definitions(root):
+    """Returns all the elements with an id that are inside a <defs>, by id.
+    """
+    defs = {}
+    for d in root.iter(f"{{{SVG_NS}}}defs"):
+        for child in d:
+            if "id" in child.attrib:
+                defs[child.attrib["id"]] = child
+    return defs
+
+def bake(tag, attrs, m):
+    """Applies a rigid transform to the coordinates of a circle or a line.
+
+    Returns the new attributes, or None if the shape can't be transformed
+    that way.
+    """
+    attrs = dict(attrs)
+    if tag == "circle":
+        cx, cy = apply(m, float(attrs.get("cx", 0)), float(attrs.get("cy", 0)))
+        attrs["cx"], attrs["cy"] = cx, cy
+    elif tag == "line":
+        x1, y1 = apply(m, float(attrs.get("x1", 0)), float(attrs.get("y1", 0)))
+        x2, y2 = apply(m, float(attrs.get("x2", 0)), float(attrs.get("y2", 0)))
+        attrs.update(x1=x1, y1=y1, x2=x2, y2=y2)
+    else:
+        return None
+    return attrs
+
+class _Compactor:
+    """Compacts the elements of an svg file into (tag, attrs, matrix,
+    children) tuples. The numbers are rounded only when rendering, so that
+    the errors don't add up when shapes are moved more than once.
+    """
+    def __init__(self, root, precision):
+        self.precision = precision
+        self.definitions = _find_definitions(root)
+        self.compacted = {}
+        self.used = []
+
+    def definition(self, id):
+        """Returns the compacted content of a definition.
+        """
+        if id not in self.compacted:
+            self.compacted[id] = None  # guards against cycles
+            self.compacted[id] = self.element(self.definitions[id], IDENTITY, keep_id=False)
+        return self.compacted[id]
+
+    def element(self, elem, m, keep_id=True):
+        """Returns the compacted version of an element, with the matrix m
+        of the enclosing groups applied, as a list of nodes.
+        """
+        tag = local_name(elem.tag)
+        m = multiply(m, parse_transform(elem.get("transform")))
+        attrs = _attrs(elem)
+        if not keep_id:
+            attrs.pop("id", None)
+
+        if tag == "defs":
+            return []
+
+        if tag == "use":
+            id = elem.get(HREF, elem.get("href", ""))[1:]
+            m = multiply(m, translation(float(attrs.pop("x", 0)), float(attrs.pop("y", 0))))
+            content = self.definition(id)
+            if content is not None and len(content) == 1 and not attrs and not content[0][3]:
+                # a single shape is smaller written out than referenced
+                ctag, cattrs, cm, _ = content[0]
+                return [self.shape(ctag, cattrs, multiply(m, cm))]
+            if id not in self.used:
+                self.used.append(id)
+            attrs["xlink:href"] = "#" + id
+            return [self.shape("use", attrs, m)]
+
+        if tag == "g":
+            if set(attrs) - {"id"}:
+                # styled groups are kept, with the transform on the group
+                children = [c for child in elem for c in self.element(child, IDENTITY)]
+                return [self.shape("g", attrs, m, children)]
+            return [c for child in elem for c in self.element(child, m)]
+
+        return [self.shape(tag, attrs, m, elem.text or [])]
+
+    def shape(self, tag, attrs, m, children=()):
+        if is_rigid(m):
+            baked = bake(tag, attrs, m)
+            if baked is not None:
+                attrs, m = baked, IDENTITY
+        return (tag, attrs, m, children)
+
+    def render(self, node, lines):
+        tag, attrs, m, children = node
+        attrs = {k: self.number(k, v) for k, v in attrs.items()}
+        transform = format_transform(m, self.precision)
+        if transform:
+            attrs["transform"] = transform
+        attrs_text = "".join(f' {k}="{_escape(str(v))}"' for k, v in attrs.items())
+        if isinstance(children, str):
+            lines.append(f"<{tag}{attrs_text}>{_escape(children)}</{tag}>")
+        elif children:
+            lines.append(f"<{tag}{attrs_text}>")
+            for child in children:
+                self.render(child, lines)
+            lines.append(f"</{tag}>")
+        else:
+            lines.append(f"<{tag}{attrs_text}/>")
+
+    def number(self, name, value):
+        return format_attr(name, value, self.precision)
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;")
+
+def compact_svg(svg, precision=3):
+    """Rewrites an svg file in a compact form.
+
+    Shapes that are repeated using <use> are defined once in a single
+    <defs> section at the top and the nested groups around the references
+    are flattened into one transform per reference. References to a single
+    circle or line are replaced with the shape itself at its final
+    position. All numbers are rounded to precision digits after the
+    decimal point.
+    """
+    root = ET.fromstring(svg)
+    compactor = _Compactor(root, precision)
+    body = [c for child in root for c in compactor.element(child, IDENTITY)]
+
+    # definitions are compacted when first used, so the ones they refer
+    # to are always listed before them
+    defs = [("g", {"id": id}, IDENTITY, compactor.definition(id)) for id in compactor.used]
+
+    attrs = {local_name(k): v for k, v in root.attrib.items()}
+    attrs["xmlns"] = SVG_NS
+    attrs["xmlns:xlink"] = XLINK_NS
+    lines = []
+    if defs:
+        compactor.render(("defs", {}, IDENTITY, defs), lines)
+    for node in body:
+        compactor.render(node, lines)
+    header = "<svg" + "".join(f' {k}="{_escape(v)}"' for k, v in attrs.items()) + ">"
+    return header + "\n" + "\n".join(lines) + "\n</svg>\n"
+
+def render_shape(tag, attrs, m, precision=3):
+    """Renders a flattened shape as an svg element, with its coordinates
+    moved to their final position when the transform allows it.
+    """
+    attrs = {k: v for k, v in attrs.items() if k != "id"}
+    if is_rigid(m):
+        baked = bake(tag, attrs, m)
+        if baked is not None:
+            attrs, m = baked, IDENTITY
+    attrs = {k: format_attr(k, v, precision) for k, v in attrs.items()}
+    transform = format_transform(m, precision)
+    if transform:
+        attrs["transform"] = transform
+    return f"<{tag}" + "".join(f' {k}="{_escape(str(v))}"' for k, v in attrs.items()) + "/>"
+
+def geometry(tag, attrs, m):
+    """Returns the absolute coordinates of a flattened circle, as
+    (cx, cy, r), or of a line, as (x1, y1, x2, y2). Returns None for
+    the other shapes.
+    """
+    if tag == "circle":
+        cx, cy = apply(m, float(attrs.get("cx", 0)), float(attrs.get("cy", 0)))
+        return cx, cy, float(attrs.get("r", 0)) * math.sqrt(abs(m[0]*m[3] - m[1]*m[2]))
+    elif tag == "line":
+        x1, y1 = apply(m, float(attrs.get("x1", 0)), float(attrs.get("y1", 0)))
+        x2, y2 = apply(m, float(attrs.get("x2", 0)), float(attrs.get("y2", 0)))
+        return x1, y1, x2, y2
+
+def flatten(svg):
+    """Resolves all the groups, references and transforms of an svg file.
+
+    Returns a list of (tag, attrs, matrix) tuples, one for every shape,
+    where attrs include the style inherited from the enclosing groups and
+    matrix is the combined transform of the shape.
+    """
+    root = ET.fromstring(svg)
+    definitions = _find_definitions(root)
+    shapes = []
+
+    def walk(elem, m, style):
+        tag = local_name(elem.tag)
+        if tag == "defs":
+            return
+        m = multiply(m, parse_transform(elem.get("transform")))
+        attrs = _attrs(elem)
+        if tag in ("g", "svg"):
+            style = dict(style, **{k: v for k, v in attrs.items() if k in STYLE_ATTRS})
+            for child in elem:
+                walk(child, m, style)
+        elif tag == "use":
+            id = elem.get(HREF, elem.get("href", ""))[1:]
+            m = multiply(m, translation(float(attrs.get("x", 0)), float(attrs.get("y", 0))))
+            style = dict(style, **{k: v for k, v in attrs.items() if k in STYLE_ATTRS})
+            walk(definitions[id], m, style)
+        else:
+            shapes.append((tag, dict(style, **attrs), m))
+
+    walk(root, IDENTITY, {})
+    return shapes
@@ -0,0 +1,166 @@
+"""Generates variants of a design from a grid of parameters.
+
+Usage:
+
+    python sweep.py make_concentric_circles n=30,40,50
+    python sweep.py make_polygon n=3,4,5,6,7,8 side_length=45*mm num_holes=10 -d variants/polygons
+
+Calls a design function from src/_designs.py with every combination of
+the parameter values and writes the svg of each variant, built in a pool
+of worker processes. The values are python expressions, evaluated with
+everything from _designs.py, so that 45*mm works.
+
+The variants are named after the function and the parameters that are
+swept, like polygon-n3.svg, so the same grid always gives the same files.
+A manifest.json next to them has the parameters, the number of holes,
+the bounding box in mm and the number of design rule violations, see
+drc.py, of every variant.
+"""
+import argparse
+import importlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from build import postprocess, render_design
+from drc import check_cuts
+from svgtools import format_number, geometry, mm
+from toolpath import load_cuts
+
+SRC_DIR = Path(__file__).parent / "src"
+
+def load_designs():
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+    return importlib.import_module("_designs")
+
+def parse_param(text, env):
+    """Parses a parameter like "n=3,4,5" and returns the name and the list
+    of values.
+    """
+    name, sep, values = text.partition("=")
+    if not sep or not name.isidentifier():
+        raise ValueError(f"Invalid parameter, expected name=value,...: {text!r}")
+    return name, [eval(v, env) for v in values.split(",")]
+
+def expand_grid(grid):
+    """Returns every combination of the values in the grid as a dict.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+def variant_name(function, params, swept):
+    """Returns the name of a variant, from the function name without the
+    make_ prefix and the values of the swept parameters.
+    """
+    name = function.removeprefix("make_").replace("_", "-")
+    for key in swept:
+        value = params[key]
+        if isinstance(value, float):
+            value = format_number(value, 3)
+        name += f"-{key.replace('_', '-')}{value}"
+    return name
+
+def describe(svg):
+    """Returns the number of holes, the bounding box in mm and the design
+    rule violations of a design.
+
+    Every circle is a hole, except the outlines around the whole design.
+    """
+    cuts = load_cuts(svg)
+    xs, ys = [], []
+    for cut in cuts:
+        g = geometry(cut.tag, cut.attrs, cut.m)
+        if cut.tag == "circle":
+            cx, cy, r = g
+            xs += [cx - r, cx + r]
+            ys += [cy - r, cy + r]
+        elif cut.tag == "line":
+            xs += [g[0], g[2]]
+            ys += [g[1], g[3]]
+    bounds = (min(xs), min(ys), max(xs), max(ys))
+    holes = sum(1 for cut in cuts if cut.tag == "circle" and not cut.is_outline(bounds))
+    return holes, [round(v / mm, 3) for v in bounds], check_cuts(cuts)
+
+def build_variant(function, params, output, **options):
+    """Builds one variant of the design and writes its svg to output.
+
+    Returns the entry of the variant in the manifest.
+    """
+    start = time.perf_counter()
+    designs = load_designs()
+    svg = render_design(lambda: [getattr(designs, function)(**params)])
+    svg = postprocess(svg, **options)
+    Path(output).write_text(svg)
+
+    holes, bbox, violations = describe(svg)
+    return {
+        "file": Path(output).name,
+        "function": function,
+        "params": params,
+        "holes": holes,
+        "bbox": bbox,
+        "width": round(bbox[2] - bbox[0], 3),
+        "height": round(bbox[3] - bbox[1], 3),
+        "violations": len(violations),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+def sweep(function, grid, output_dir, max_workers=None, **options):
+    """Builds every variant of the design in the grid, in a pool of worker
+    processes, and returns the manifest.
+    """
+    swept = [key for key, values in grid.items() if len(values) > 1]
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    variants = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for params in expand_grid(grid):
+            output = output_dir / (variant_name(function, params, swept) + ".svg")
+            futures.append(executor.submit(build_variant, function, params, str(output), **options))
+        for f in futures:
+            entry = f.result()
+            print(f"{entry['file']}: {entry['holes']} holes, "
+                  f"{entry['width']:g}x{entry['height']:g}mm, {entry['violations']} design rule violations, "
+                  f"{entry['seconds']:.3f}s", file=sys.stderr)
+            variants.append(entry)
+
+    manifest = {"function": function, "grid": grid, "variants": variants}
+    for entry in variants:
+        del entry["seconds"]
+    (output_dir / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n")
+    return manifest
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("function", help="name of the design function in src/_designs.py")
+    p.add_argument("params", nargs="*", metavar="name=value,...", help="values of a parameter to sweep")
+    p.add_argument("-d", "--output-dir", default="variants", help="directory to write the variants to")
+    p.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    p.add_argument("--compact", action="store_true", help="define repeated shapes once and round the numbers")
+    p.add_argument("--toolpath", action="store_true", help="order the shapes to keep the travel of the laser head short")
+    p.add_argument("--precision", type=int, default=3, help="digits after the decimal point with --compact or --toolpath")
+    args = p.parse_args()
+
+    designs = load_designs()
+    if not callable(getattr(designs, args.function, None)):
+        p.error(f"no function {args.function} in _designs.py")
+    env = dict(vars(designs))
+    try:
+        grid = dict(parse_param(param, env) for param in args.params)
+    except (ValueError, SyntaxError, NameError) as e:
+        p.error(str(e))
+
+    start = time.perf_counter()
+    manifest = sweep(args.function, grid, args.output_dir, max_workers=args.jobs,
+                     compact=args.compact, toolpath=args.toolpath, precision=args.precision)
+    print(f"built {len(manifest['variants'])} variants in {time.perf_counter() - start:.3f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
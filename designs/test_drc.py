@@ -0,0 +1,67 @@
+import pytest
+
+from drc import DesignRuleError, Grid, check_cuts, check_svg
+from svgtools import mm
+from toolpath import load_cuts
+
+def design(*shapes):
+    """An svg with the given shapes inside a red square outline, 100mm on
+    each side, with the sizes in mm.
+    """
+    s = 100 * mm
+    outline = [f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="red"/>'
+               for x1, y1, x2, y2 in [(0, 0, s, 0), (s, 0, s, s), (s, s, 0, s), (0, s, 0, 0)]]
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {s} {s}">'
+            + "".join(outline + list(shapes)) + "</svg>")
+
+def hole(x, y, r=1):
+    return f'<circle cx="{x*mm}" cy="{y*mm}" r="{r*mm}" stroke="black"/>'
+
+def test_clean_design_passes():
+    svg = design(hole(20, 20), hole(30, 20), hole(50, 50, r=5), hole(80, 80))
+    assert check_cuts(load_cuts(svg)) == []
+    check_svg(svg)
+
+def test_holes_too_close():
+    # 1mm between the edges of the holes
+    violations = check_cuts(load_cuts(design(hole(20, 20), hole(23, 20), hole(60, 60))))
+    assert len(violations) == 1
+    assert "1.00mm apart" in violations[0]
+
+def test_hole_too_close_to_the_edge():
+    # 1.5mm from the left edge of the outline
+    violations = check_cuts(load_cuts(design(hole(2.5, 50), hole(50, 50))))
+    assert len(violations) == 1
+    assert "1.50mm from the edge" in violations[0]
+
+def test_hole_too_close_to_an_outline_circle():
+    svg = (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{-50*mm} {-50*mm} {100*mm} {100*mm}">'
+           f'<circle cx="0" cy="0" r="{50*mm}" stroke="black"/>'
+           + hole(0, 0) + hole(0, 48) + "</svg>")
+    violations = check_cuts(load_cuts(svg))
+    assert len(violations) == 1
+    assert "from the edge" in violations[0]
+
+def test_check_svg_raises():
+    with pytest.raises(DesignRuleError) as e:
+        check_svg(design(hole(20, 20), hole(22.5, 20)))
+    assert len(e.value.violations) == 1
+
+def test_limits_are_in_mm():
+    svg = design(hole(20, 20), hole(24, 20))
+    assert check_cuts(load_cuts(svg), min_spacing=1.5) == []
+    assert len(check_cuts(load_cuts(svg), min_spacing=2.5)) == 1
+
+def test_segment_cells_include_clipped_corners():
+    grid = Grid(1.0)
+    # clips the corner of cell (1, 0), between the samples at every half cell
+    cells = grid.segment_cells((0.1, 0.95), (1.9, -0.85))
+    assert (1, 0) in cells
+    assert cells == {(0, 0), (1, 0), (1, -1)}
+
+def test_segment_cells_match_a_fine_walk():
+    grid = Grid(1.0)
+    for a, b in [((0.2, 0.3), (5.7, 2.1)), ((3.5, -1.2), (-2.4, 4.9)), ((0.5, 0.5), (0.5, -3.5))]:
+        n = 10000
+        walk = {grid.cell((a[0] + (b[0] - a[0]) * k / n, a[1] + (b[1] - a[1]) * k / n)) for k in range(n + 1)}
+        assert grid.segment_cells(a, b) == walk
@@ -0,0 +1,90 @@
+import itertools
+import math
+from pathlib import Path
+
+import pytest
+
+from nest import Part, pack
+from svgtools import geometry, mm, multiply
+
+SVG_DIR = Path(__file__).parent / "svg"
+MARGIN, GAP = 5, 2
+
+def parts(**counts):
+    found = []
+    for name, count in counts.items():
+        part = Part(name, (SVG_DIR / f"{name.replace('_', '-')}.svg").read_text())
+        found += [part] * count
+    return found
+
+def outline(placement):
+    """The points of the shapes of a placed part on the sheet, in mm.
+    """
+    points = []
+    for tag, attrs, m in placement.part.shapes:
+        g = geometry(tag, attrs, multiply(placement.matrix(), m))
+        if tag == "circle":
+            cx, cy, r = g
+            points += [(cx + r*math.cos(t), cy + r*math.sin(t)) for t in (i * math.pi/16 for i in range(32))]
+        elif tag == "line":
+            points += [g[:2], g[2:]]
+    return [(x/mm, y/mm) for x, y in points]
+
+def size(p):
+    """The bounding shape of a placement without the gap, as the radius or
+    the width and height.
+    """
+    if p.kind == "circle":
+        return p.part.r
+    return (p.part.w, p.part.h) if p.rotation == 0 else (p.part.h, p.part.w)
+
+def rect_distance(x, y, p):
+    w, h = size(p)
+    dx = max(p.x - w/2 - x, 0, x - p.x - w/2)
+    dy = max(p.y - h/2 - y, 0, y - p.y - h/2)
+    return math.hypot(dx, dy)
+
+def apart(p, q):
+    """The distance between the bounding shapes of two placements.
+    """
+    if p.kind == "circle" and q.kind == "circle":
+        return math.hypot(p.x - q.x, p.y - q.y) - size(p) - size(q)
+    if p.kind == "circle" or q.kind == "circle":
+        circle, rect = (p, q) if p.kind == "circle" else (q, p)
+        return rect_distance(circle.x, circle.y, rect) - size(circle)
+    (w1, h1), (w2, h2) = size(p), size(q)
+    return max(abs(p.x - q.x) - (w1 + w2)/2, abs(p.y - q.y) - (h1 + h2)/2)
+
+def check_sheets(sheets, parts, width, height):
+    placed = [p for sheet in sheets for p in sheet.placements]
+    assert sorted(p.part.name for p in placed) == sorted(p.name for p in parts)
+    for sheet in sheets:
+        for p in sheet.placements:
+            for x, y in outline(p):
+                assert MARGIN - 1e-6 <= x <= width - MARGIN + 1e-6
+                assert MARGIN - 1e-6 <= y <= height - MARGIN + 1e-6
+                # the part is inside the bounding shape it was packed with
+                if p.kind == "circle":
+                    assert math.hypot(x - p.x, y - p.y) <= size(p) + 1e-6
+                else:
+                    assert rect_distance(x, y, p) <= 1e-6
+        for p, q in itertools.combinations(sheet.placements, 2):
+            assert apart(p, q) >= GAP - 1e-6, (p.part, q.part)
+
+@pytest.mark.parametrize("counts, width, height", [
+    ({"hexagon": 4, "flower": 7, "square": 2}, 297, 210),
+    ({"concentric_circles": 6, "eight_star": 5}, 297, 210),
+    ({"triangle": 12, "flower_6": 3, "square": 3}, 420, 297),
+    # too narrow for the triangles unless they are turned
+    ({"triangle": 5}, 92, 297),
+], ids=["mixed", "round", "a3", "turned"])
+def test_placements_stay_on_the_sheet_and_apart(counts, width, height):
+    found = parts(**counts)
+    sheets = pack(found, width, height, margin=MARGIN, gap=GAP)
+    check_sheets(sheets, found, width, height)
+    if width < 100:
+        assert all(p.rotation == 90 for sheet in sheets for p in sheet.placements)
+
+def test_part_too_big_for_the_sheet():
+    with pytest.raises(ValueError):
+        pack(parts(hexagon=1), 60, 60, margin=MARGIN, gap=GAP)
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from svgtools import compact_svg, flatten, geometry
+
+SVGS = sorted(Path(__file__).parent.glob("svg/*.svg"))
+
+NESTED = """<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" viewBox="-50 -50 100 100" stroke="black">
+<defs>
+  <g id="hole"><circle cx="0" cy="0" r="1.5"/></g>
+  <g id="pair" transform="rotate(30)">
+    <use xlink:href="#hole" x="5"/>
+    <line x1="0" y1="0" x2="10" y2="0" stroke="red"/>
+  </g>
+</defs>
+<g transform="translate(10 -5) scale(1 -1)">
+  <g transform="rotate(45 3 4)">
+    <use xlink:href="#pair" y="2"/>
+    <use xlink:href="#pair" transform="rotate(-90)"/>
+  </g>
+  <g stroke="blue" transform="scale(2)">
+    <use xlink:href="#hole"/>
+  </g>
+</g>
+</svg>
+"""
+
+def shapes(svg):
+    """The shapes of the svg, in order, with their absolute coordinates and
+    their stroke.
+    """
+    return [(tag, geometry(tag, attrs, m), attrs.get("stroke")) for tag, attrs, m in flatten(svg)]
+
+def assert_same_geometry(svg, compact, tolerance):
+    expected, actual = shapes(svg), shapes(compact)
+    assert [(tag, stroke) for tag, _, stroke in actual] == [(tag, stroke) for tag, _, stroke in expected]
+    for (_, g1, _), (_, g2, _) in zip(expected, actual):
+        assert g2 == pytest.approx(g1, abs=tolerance)
+
+@pytest.mark.parametrize("path", SVGS, ids=lambda p: p.name)
+def test_compact_svg_keeps_the_geometry(path):
+    svg = path.read_text()
+    compact = compact_svg(svg)
+    assert len(compact) < len(svg)
+    assert_same_geometry(svg, compact, 2e-3)
+
+def test_compact_svg_of_nested_references():
+    assert_same_geometry(NESTED, compact_svg(NESTED), 2e-3)
+
+def test_compact_svg_rounds_to_precision():
+    assert_same_geometry(NESTED, compact_svg(NESTED, precision=1), 0.2)
+    assert_same_geometry(NESTED, compact_svg(NESTED, precision=6), 2e-6)
+
+def test_compact_svg_is_stable():
+    compact = compact_svg(NESTED)
+    assert compact_svg(compact) == compact
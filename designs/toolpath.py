@@ -0,0 +1,355 @@
+"""Orders the cuts of a design to reduce the travel of the laser head.
+
+Usage:
+
+    python toolpath.py svg/*.svg
+
+The shapes of a design come out in the order repeat() and cycle() make
+them, which sends the laser head back and forth across the sheet between
+cuts. optimize_order finds a shorter route: it starts with the nearest
+neighbour tour, using a grid index to find the nearest uncut shape, and
+then improves it with 2-opt moves between neighbouring shapes. Lines can
+be cut in either direction and circles are entered at the point closest
+to the head when the route gets to them. That point is then part of the
+route, so 2-opt and travel measure the same distances.
+
+The outlines, the red lines and the circles around the whole design, are
+cut last so that the part doesn't move once it is free from the sheet.
+
+Prints the travel before and after optimizing for every file.
+"""
+import argparse
+import math
+from collections import Counter
+import xml.etree.ElementTree as ET
+
+from svgtools import flatten, geometry, mm, render_shape
+
+class Cut:
+    """A shape to be cut.
+
+    start and end are the points where the cut starts and ends. A circle
+    starts and ends at its entry point, see enter, and at its centre until
+    it has one.
+    """
+    def __init__(self, tag, attrs, m):
+        self.tag = tag
+        self.attrs = attrs
+        self.m = m
+        self.reversed = False
+        self.entry = None
+
+        g = geometry(tag, attrs, m)
+        if tag == "circle":
+            cx, cy, self.r = g
+            self.points = [(cx, cy), (cx, cy)]
+        elif tag == "line":
+            self.points = [g[:2], g[2:]]
+        else:
+            # other shapes are cut from their origin
+            self.points = [m[4:], m[4:]]
+
+    @property
+    def start(self):
+        if self.entry is not None:
+            return self.entry
+        return self.points[1] if self.reversed else self.points[0]
+
+    @property
+    def end(self):
+        if self.entry is not None:
+            return self.entry
+        return self.points[0] if self.reversed else self.points[1]
+
+    def gap(self, p):
+        """Returns the distance from p to the closest point where the cut
+        can start.
+        """
+        if self.tag == "circle":
+            return abs(distance(p, self.points[0]) - self.r)
+        return min(distance(p, q) for q in self.points)
+
+    def enter(self, p):
+        """Makes the laser head coming from p enter a circle at its point
+        closest to p, or a line at its end closest to p.
+        """
+        if self.tag == "circle":
+            (cx, cy), d = self.points[0], distance(p, self.points[0])
+            if d > 0:
+                k = self.r / d
+                self.entry = (cx + (p[0] - cx) * k, cy + (p[1] - cy) * k)
+            else:
+                self.entry = (cx + self.r, cy)
+        else:
+            self.reversed = distance(p, self.points[1]) < distance(p, self.points[0])
+
+    def is_outline(self, bounds):
+        """Tells if this is an outline of the design, a red line or a
+        circle around everything else.
+        """
+        if self.attrs.get("stroke") == "red":
+            return True
+        if self.tag == "circle":
+            (cx, cy), r = self.points[0], self.r
+            x1, y1, x2, y2 = bounds
+            return cx - r <= x1 + 1e-6 and cy - r <= y1 + 1e-6 and cx + r >= x2 - 1e-6 and cy + r >= y2 - 1e-6
+        return False
+
+    def render(self, precision=3):
+        attrs = self.attrs
+        if self.reversed and self.tag == "line":
+            attrs = dict(attrs, x1=attrs["x2"], y1=attrs["y2"], x2=attrs["x1"], y2=attrs["y1"])
+        return render_shape(self.tag, attrs, self.m, precision)
+
+def distance(p, q):
+    return math.hypot(p[0] - q[0], p[1] - q[1])
+
+def travel(cuts, home=(0, 0)):
+    """Returns the distance travelled by the laser head without cutting,
+    going through the cuts in order.
+    """
+    total = 0
+    position = home
+    for cut in cuts:
+        total += distance(position, cut.start)
+        position = cut.end
+    return total
+
+def enter_circles(cuts, home=(0, 0)):
+    """Enters every circle at its point closest to where the laser head is
+    when it gets there, going through the cuts in order.
+    """
+    position = home
+    for cut in cuts:
+        if cut.tag == "circle":
+            cut.enter(position)
+        position = cut.end
+    return cuts
+
+class GridIndex:
+    """Spatial index of the end points of the cuts, for finding the nearest
+    ones to a point.
+    """
+    def __init__(self, cuts):
+        points = [p for cut in cuts for p in cut.points]
+        xs = [x for x, y in points]
+        ys = [y for x, y in points]
+        area = (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1)
+        self.size = math.sqrt(area / len(points)) * 2
+        self.cells = {}
+        self.count = len(cuts)
+        # a circle can be this much closer than its centre
+        self.max_r = max((cut.r for cut in cuts if cut.tag == "circle"), default=0)
+        for i, cut in enumerate(cuts):
+            for p in cut.points:
+                self.cells.setdefault(self._cell(p), set()).add(i)
+        # the number of cells with points in every column and row, which
+        # keep the bounds of those cells up to date as cuts are removed
+        self.columns = Counter(x for x, y in self.cells)
+        self.rows = Counter(y for x, y in self.cells)
+        self._update_bounds()
+
+    def _cell(self, p):
+        return int(math.floor(p[0] / self.size)), int(math.floor(p[1] / self.size))
+
+    def _update_bounds(self):
+        if self.cells:
+            self.bounds = min(self.columns), min(self.rows), max(self.columns), max(self.rows)
+
+    def remove(self, i, cut):
+        self.count -= 1
+        for p in cut.points:
+            cell = self._cell(p)
+            if cell not in self.cells:
+                # both end points are in the same cell
+                continue
+            self.cells[cell].discard(i)
+            if not self.cells[cell]:
+                del self.cells[cell]
+                x, y = cell
+                self.columns[x] -= 1
+                self.rows[y] -= 1
+                if not self.columns[x]:
+                    del self.columns[x]
+                if not self.rows[y]:
+                    del self.rows[y]
+                if x not in self.columns or y not in self.rows:
+                    self._update_bounds()
+
+    def nearby(self, p, rings):
+        """Returns the cuts with an end point within the given number of
+        rings of cells around p.
+        """
+        cx, cy = self._cell(p)
+        found = set()
+        for x in range(cx - rings, cx + rings + 1):
+            for y in range(cy - rings, cy + rings + 1):
+                found.update(self.cells.get((x, y), ()))
+        return found
+
+    def nearest(self, p, cuts):
+        """Returns the index of the cut that the laser head at p gets to
+        first, see Cut.gap.
+
+        Looks at the cells in rings around p, until the ring is further
+        away than the nearest cut found so far.
+        """
+        if not self.count:
+            return None
+        cx, cy = self._cell(p)
+        # no need to look further than the cells that have any points
+        x1, y1, x2, y2 = self.bounds
+        max_rings = max(abs(cx - x1), abs(cx - x2), abs(cy - y1), abs(cy - y2))
+
+        best, best_distance = None, math.inf
+        for rings in range(max_rings + 1):
+            for cell in self._ring(cx, cy, rings):
+                for i in self.cells.get(cell, ()):
+                    d = cuts[i].gap(p)
+                    if d < best_distance:
+                        best, best_distance = i, d
+            if best is not None and best_distance <= rings * self.size - self.max_r:
+                break
+        return best
+
+    def _ring(self, cx, cy, rings):
+        if rings == 0:
+            return [(cx, cy)]
+        top = [(x, cy - rings) for x in range(cx - rings, cx + rings + 1)]
+        bottom = [(x, cy + rings) for x in range(cx - rings, cx + rings + 1)]
+        left = [(cx - rings, y) for y in range(cy - rings + 1, cy + rings)]
+        right = [(cx + rings, y) for y in range(cy - rings + 1, cy + rings)]
+        return top + bottom + left + right
+
+def nearest_neighbour(cuts, home):
+    """Orders the cuts by always going to the nearest uncut one next.
+    """
+    index = GridIndex(cuts)
+    order = []
+    position = home
+    for _ in range(len(cuts)):
+        i = index.nearest(position, cuts)
+        index.remove(i, cuts[i])
+        cut = cuts[i]
+        cut.enter(position)
+        order.append(cut)
+        position = cut.end
+    return order
+
+def two_opt(order, home, neighbours=8, max_rounds=50):
+    """Improves the order by reversing the runs of cuts that make the
+    route shorter.
+
+    Only the moves that join a cut with one of its nearest neighbours are
+    tried, which keeps each round close to linear in the number of cuts.
+    The neighbours are the nearest by either end point, which don't change
+    when a run of cuts is reversed, so the lists hold for the whole search.
+    """
+    n = len(order)
+    if n < 3:
+        return order
+
+    def apart(cut, other):
+        return min(distance(p, q) for p in (cut.start, cut.end) for q in (other.start, other.end))
+
+    index = GridIndex(order)
+    near = []
+    for cut in order:
+        rings = 1
+        found = index.nearby(cut.points[0], rings) | index.nearby(cut.points[1], rings)
+        while len(found) < min(neighbours + 1, n) and rings < 64:
+            rings *= 2
+            found = index.nearby(cut.points[0], rings) | index.nearby(cut.points[1], rings)
+        found = sorted(found, key=lambda i: apart(cut, order[i]))
+        near.append([order[i] for i in found[:neighbours + 1]])
+
+    position = {id(cut): k for k, cut in enumerate(order)}
+    near = {id(order[k]): cuts for k, cuts in enumerate(near)}
+
+    def end_of(k):
+        return home if k < 0 else order[k].end
+
+    for _ in range(max_rounds):
+        improved = False
+        for i in range(n - 1):
+            before = order[i - 1] if i > 0 else None
+            candidates = near[id(before)] if before else list(order)
+            for other in candidates:
+                j = position[id(other)]
+                if j <= i:
+                    continue
+                a, b = end_of(i - 1), order[i].start
+                c, d = order[j].end, order[j + 1].start if j + 1 < n else None
+                old = distance(a, b) + (distance(c, d) if d else 0)
+                new = distance(a, c) + (distance(b, d) if d else 0)
+                if new < old - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    for k in range(i, j + 1):
+                        order[k].reversed = not order[k].reversed
+                        position[id(order[k])] = k
+                    improved = True
+        if not improved:
+            break
+    return order
+
+def optimize_order(cuts, home=(0, 0)):
+    """Returns the cuts in the order that keeps the travel of the laser
+    head short, with the outlines last.
+    """
+    if not cuts:
+        return []
+    points = [p for cut in cuts for p in cut.points]
+    bounds = (min(x for x, y in points), min(y for x, y in points),
+              max(x for x, y in points), max(y for x, y in points))
+    inner = [cut for cut in cuts if not cut.is_outline(bounds)]
+    outlines = [cut for cut in cuts if cut.is_outline(bounds)]
+
+    order = []
+    position = home
+    for group in (inner, outlines):
+        if group:
+            group = two_opt(nearest_neighbour(group, position), position)
+            # the runs 2-opt reversed come to some circles from elsewhere
+            group = enter_circles(group, position)
+            order += group
+            position = group[-1].end
+    return order
+
+def load_cuts(svg):
+    return [Cut(tag, attrs, m) for tag, attrs, m in flatten(svg)]
+
+def home_position(svg):
+    """Returns the top-left corner of the svg, where the laser head starts.
+    """
+    root = ET.fromstring(svg)
+    x, y, *_ = [float(v) for v in root.get("viewBox", "0 0 0 0").split()]
+    return x, y
+
+def optimize_svg(svg, precision=3):
+    """Rewrites the svg with all the shapes at their final position and in
+    the order that keeps the travel of the laser head short.
+    """
+    root = ET.fromstring(svg)
+    cuts = optimize_order(load_cuts(svg), home_position(svg))
+    attrs = "".join(f' {k}="{v}"' for k, v in root.attrib.items())
+    lines = [f'<svg{attrs} xmlns="http://www.w3.org/2000/svg">']
+    lines += [cut.render(precision) for cut in cuts]
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filenames", nargs="+")
+    args = p.parse_args()
+
+    print(f"{'design':28s} {'cuts':>5s} {'before mm':>10s} {'after mm':>10s}")
+    for filename in args.filenames:
+        svg = open(filename).read()
+        home = home_position(svg)
+        cuts = load_cuts(svg)
+        before = travel(enter_circles(cuts, home), home)
+        after = travel(optimize_order(cuts, home), home)
+        print(f"{filename:28s} {len(cuts):5d} {before/mm:10.1f} {after/mm:10.1f}  ({after/before - 1:+.0%})")
+
+if __name__ == "__main__":
+    main()
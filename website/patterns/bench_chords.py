@@ -0,0 +1,61 @@
+"""Compares drawing the chords of a pattern one by one with connect against
+drawing them all at once with chords.connect_many.
+
+Usage:
+
+    python bench_chords.py [-n 200 500 1000] [--max-loop 300000]
+
+The pattern is the mystic rose, every pin connected to every other pin,
+which has n*(n-1)/2 chords. Reports the time to add the chords, to make
+the svg and the size of the svg. The loop is skipped for patterns with
+more than --max-loop chords, as it takes too long and too much memory.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from build import new_canvas
+from chords import connect_many
+from stringart import connect, make_circle
+
+def loop(n):
+    make_circle(n)
+    for i in range(n):
+        for j in range(i + 1, n):
+            connect(i, j)
+
+def bulk(n):
+    make_circle(n)
+    i, j = np.triu_indices(n, k=1)
+    connect_many(i, j)
+
+def measure(draw, n):
+    with new_canvas() as art:
+        start = time.perf_counter()
+        draw(n)
+        drawn = time.perf_counter()
+        svg = art.as_svg()
+        end = time.perf_counter()
+    return drawn - start, end - drawn, len(svg)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("-n", type=int, nargs="+", default=[200, 300, 500, 700, 1000], help="numbers of pins")
+    p.add_argument("--max-loop", type=int, default=300000, help="most chords to draw with the loop")
+    args = p.parse_args()
+
+    print(f"{'pins':>5s} {'chords':>7s} {'':6s} {'draw ms':>9s} {'svg ms':>9s} {'svg KB':>9s}")
+    for n in args.n:
+        chords = n * (n - 1) // 2
+        results = [("bulk", measure(bulk, n))]
+        if chords <= args.max_loop:
+            results.insert(0, ("loop", measure(loop, n)))
+        for name, (draw, render, size) in results:
+            print(f"{n:5d} {chords:7d} {name:6s} {draw*1000:9.1f} {render*1000:9.1f} {size/1024:9.0f}")
+        if len(results) == 2:
+            (_, a), (_, b) = results
+            print(f"{'':5s} {'':7s} {'':6s} {a[0]/b[0]:8.0f}x {a[1]/b[1]:8.0f}x {a[2]/b[2]:8.1f}x")
+
+if __name__ == "__main__":
+    main()
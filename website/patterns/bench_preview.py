@@ -0,0 +1,53 @@
+"""Measures the time taken to draw the raster preview of patterns with many
+chords.
+
+Usage:
+
+    python bench_preview.py [--size 1024] [--chords 10000 100000]
+
+The patterns have 300 pins connected at random. Reports the time to draw
+the image, and to write it as png and as webp.
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+
+from chords import Canvas
+from preview import render_raster
+
+def make_pattern(num_chords, num_pins=300, seed=0):
+    rng = np.random.default_rng(seed)
+    art = Canvas()
+    art.make_circle(num_pins)
+    art.connect_many(rng.integers(0, num_pins, num_chords), rng.integers(0, num_pins, num_chords))
+    return art
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--size", type=int, default=1024, help="width and height of the image in pixels")
+    p.add_argument("--chords", type=int, nargs="+", default=[10000, 100000], help="numbers of chords")
+    args = p.parse_args()
+
+    from PIL import Image
+
+    print(f"{'chords':>7s} {'draw ms':>9s} {'png ms':>9s} {'webp ms':>9s} {'png KB':>8s} {'webp KB':>8s}")
+    for num_chords in args.chords:
+        art = make_pattern(num_chords)
+        start = time.perf_counter()
+        image = Image.fromarray(render_raster(art, size=args.size), "RGBA")
+        draw = time.perf_counter() - start
+
+        results = []
+        for format in ("png", "webp"):
+            f = io.BytesIO()
+            start = time.perf_counter()
+            image.save(f, format=format)
+            results.append((time.perf_counter() - start, len(f.getvalue())))
+        (png, png_size), (webp, webp_size) = results
+        print(f"{num_chords:7d} {draw*1000:9.0f} {png*1000:9.0f} {webp*1000:9.0f} "
+              f"{png_size/1024:8.0f} {webp_size/1024:8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Measures the time taken to make a string art pattern out of a picture.
+
+Usage:
+
+    python bench_solver.py [--pins 300] [--chords 4000] [--size 300] [-j 1 2 4]
+
+The picture is made up, blurred noise of every shade of gray, so that the
+thread goes everywhere. Reports the time to find the pixels of the chords
+and the time to pick the chords, with the chords scored in 1, 2, ...
+threads.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from solver import Chords, solve
+
+def make_picture(size, seed=0):
+    from PIL import Image, ImageFilter
+
+    rng = np.random.default_rng(seed)
+    noise = Image.fromarray((rng.random((40, 40)) * 255).astype(np.uint8))
+    image = noise.resize((size, size), Image.BICUBIC).filter(ImageFilter.GaussianBlur(size / 75))
+    return 1 - np.asarray(image, dtype=np.float32) / 255
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--pins", type=int, default=300, help="number of pins")
+    p.add_argument("--chords", type=int, default=4000, help="most chords to draw")
+    p.add_argument("--size", type=int, default=300, help="width and height of the picture in pixels")
+    p.add_argument("--thread", type=float, default=0.03, help="how dark a pixel under a thread gets")
+    p.add_argument("-j", "--jobs", type=int, nargs="+", default=[1, 2, 4], help="numbers of threads")
+    args = p.parse_args()
+
+    darkness = make_picture(args.size)
+    start = time.perf_counter()
+    chords = Chords(args.pins, args.size)
+    prepared = time.perf_counter() - start
+    size = (chords.index.nbytes + chords.weight.nbytes) / 2**20
+    print(f"{args.pins} pins, {len(chords.start)} chords, {chords.index.size} pixels ({size:.0f} MB) in {prepared*1000:.0f}ms")
+
+    print(f"{'jobs':>5s} {'chords':>7s} {'solve ms':>9s} {'ms/chord':>9s}")
+    for jobs in args.jobs:
+        start = time.perf_counter()
+        sequence = solve(darkness, num_pins=args.pins, num_chords=args.chords, thread=args.thread,
+                         jobs=jobs, chords=chords)
+        seconds = time.perf_counter() - start
+        print(f"{jobs:5d} {len(sequence) - 1:7d} {seconds*1000:9.0f} {seconds*1000/(len(sequence) - 1):9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,191 @@
+"""Builds the svg images of the string art patterns.
+
+Usage:
+
+    python build.py images/ring.py > images/ring.svg
+    python build.py images/ring.py -o images/ring.svg
+    python build.py images/*.py
+
+Every pattern script runs with a new canvas and in a new namespace, so
+that many patterns can be rendered one after the other in the same
+process. With more than one script, the svg of each is written next to
+it, or to --output-dir, and with -j they are spread across a pool of
+worker processes.
+
+When writing the files, an image is only built when the script, the local
+modules it imports, the stringart and joy versions or build.py itself have
+changed since the last build. The hashes are kept in .build-cache.json.
+
+With --watch, the images are built and then rebuilt whenever their scripts
+change, and shown in the browser. This uses buildtools/devserver.py from
+the top of the repository. Changes to build.py or chords.py restart the
+preview:
+
+    python build.py --watch images/*.py
+"""
 import argparse
+import hashlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from importlib.metadata import version
+from pathlib import Path
+
 import stringart
+from chords import Canvas
+
+# the helpers shared with the build of the designs are in buildtools/ at
+# the top of the repository
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from buildtools.buildcache import find_local_imports, load_cache, save_cache
+
+CACHE_FILE = Path(__file__).parent / ".build-cache.json"
+
+# build.py and the modules it uses, which every pattern depends on
+HERE = Path(__file__).resolve().parent
+BUILD_SOURCES = [HERE / "build.py", HERE / "chords.py"]
+
+def compute_key(filename):
+    """Returns the hash of everything the image of a pattern depends on.
+    """
+    h = hashlib.sha256()
+    h.update(f"stringart {version('stringart')}\njoy {version('python-joy')}\n".encode())
+    for path in [*BUILD_SOURCES, Path(filename), *find_local_imports(filename)]:
+        h.update(f"{path.name}\n".encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+@contextmanager
+def new_canvas():
+    """Gives the functions of stringart, like make_circle and connect, a
+    new canvas to draw on while in the with block.
+
+    The canvas also supports chords.connect_many.
+    """
+    art = Canvas()
+    # the functions draw on the module level canvas
+    saved, stringart._art = stringart._art, art
+    try:
+        yield art
+    finally:
+        stringart._art = saved
+
+def run(filename):
+    """Runs a pattern script and returns the canvas it draws on.
+    """
+    code = Path(filename).read_text()
+    env = {"__name__": "__main__", "__file__": str(filename)}
+
+    # the local modules are next to the scripts
+    src_dir = str(Path(filename).parent.resolve())
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+
+    with new_canvas() as art:
+        exec(compile(code, str(filename), "exec"), env)
+    return art
+
+def render(filename):
+    """Runs a pattern script and returns the svg of what it draws.
+    """
+    return run(filename).as_svg()
+
+def build(filename, output):
+    """Renders the pattern in filename and writes the svg to output.
+
+    Returns the time taken in seconds.
+    """
+    start = time.perf_counter()
+    svg = render(filename)
+    Path(output).write_text(svg + "\n")
+    return time.perf_counter() - start
+
+def build_batch(jobs, max_workers=1):
+    """Builds many patterns, in this process or in a pool of worker
+    processes when max_workers is more than 1.
+
+    The jobs are (filename, output) pairs.
+    """
+    start = time.perf_counter()
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(filename, executor.submit(build, filename, output)) for filename, output in jobs]
+            times = [(filename, f.result()) for filename, f in futures]
+    else:
+        times = [(filename, build(filename, output)) for filename, output in jobs]
+    for filename, seconds in times:
+        print(f"{filename}: {seconds*1000:.1f}ms", file=sys.stderr)
+    total = time.perf_counter() - start
+    print(f"built {len(jobs)} images in {total*1000:.0f}ms", file=sys.stderr)
+
+def watch(filenames, port=None):
+    """Builds the images and rebuilds them in this process whenever their
+    scripts change, showing them in the browser.
+    """
+    from buildtools.devserver import DEFAULT_PORT, serve
+
+    def rebuild(source):
+        svg = render(source)
+        source.with_suffix(".svg").write_text(svg + "\n")
+        return svg
+
+    serve(filenames, rebuild, find_local_imports, title="patterns", port=port or DEFAULT_PORT,
+          restart_on=BUILD_SOURCES)
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filenames", nargs="+", metavar="filename")
+    p.add_argument("-o", "--output", help="output filename, for a single image. The svg is printed when there is no output")
+    p.add_argument("-d", "--output-dir", help="directory to write the svg files to, next to the scripts by default")
+    p.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes")
+    p.add_argument("-f", "--force", action="store_true", help="rebuild even if the output is up to date")
+    p.add_argument("--watch", action="store_true", help="rebuild the images when their scripts change and show them in the browser")
+    p.add_argument("--port", type=int, help="port of the browser preview with --watch")
+    args = p.parse_args()
+
+    if args.watch:
+        watch(args.filenames, port=args.port)
+        return
+    if args.output and len(args.filenames) > 1:
+        p.error("-o/--output can only be used with a single image, use -d instead")
+
+    if len(args.filenames) == 1 and not args.output and not args.output_dir:
+        print(render(args.filenames[0]))
+        return
+
+    jobs = []
+    for filename in args.filenames:
+        if args.output:
+            output = args.output
+        elif args.output_dir:
+            output = str(Path(args.output_dir, Path(filename).stem + ".svg"))
+        else:
+            output = str(Path(filename).with_suffix(".svg"))
+        jobs.append((filename, output))
+
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    cache = load_cache(CACHE_FILE)
+    keys = {output: compute_key(filename) for filename, output in jobs}
+    if not args.force:
+        jobs = [(filename, output) for filename, output in jobs
+                if not (Path(output).exists() and cache.get(output) == keys[output])]
+        if not jobs:
+            print("all images are up to date", file=sys.stderr)
+            return
 
-p = argparse.ArgumentParser()
-p.add_argument("filename")
-args = p.parse_args()
+    if len(jobs) == 1:
+        build(*jobs[0])
+    else:
+        build_batch(jobs, max_workers=args.jobs)
 
-code = open(args.filename).read()
+    # read again, another build may have updated it in the meantime
+    cache = load_cache(CACHE_FILE)
+    for filename, output in jobs:
+        cache[output] = keys[output]
+    save_cache(CACHE_FILE, cache)
 
-exec(code)
-svg = stringart._art._repr_svg_()
-print(svg)
+if __name__ == "__main__":
+    main()
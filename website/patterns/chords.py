@@ -0,0 +1,114 @@
+"""Draws many chords at once, for patterns with hundreds of pins.
+
+Usage, in a pattern script:
+
+    from stringart import *
+    from chords import connect_many
+    import numpy as np
+
+    n = 500
+    make_circle(n)
+    i = np.arange(n)
+    connect_many(i, 2*i)
+
+connect_many takes arrays of pin numbers, that wrap around like the ones
+of connect, and adds all the chords between them in one go. The positions
+of the pins are computed once, and the chords of each color are drawn as a
+single <path> instead of a <line> element each, which keeps the svg of a
+pattern with a hundred thousand chords small and quick to make.
+
+build.py draws every pattern on a Canvas, which is a StringArt that also
+knows how to draw these chords.
+"""
+import numpy as np
+import stringart
+from joy import Group, Shape
+
+# digits after the decimal point in the paths
+PRECISION = 2
+
+class Canvas(stringart.StringArt):
+    """StringArt with support for drawing many chords at once.
+
+    The chords are kept as arrays of pin numbers, one pair for every call
+    to connect_many, along with the color.
+    """
+    def reset(self):
+        super().reset()
+        self.chords = []
+
+    def pins(self):
+        """Returns the positions of the pins as an array of shape (n, 2).
+        """
+        return np.asarray(self.points, dtype=float).reshape(-1, 2)
+
+    def connect_many(self, a, b):
+        n = len(self.points)
+        if n == 0:
+            raise ValueError("connect_many needs the pins, call make_circle first")
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64))
+        self.chords.append((self.line_color, a.ravel() % n, b.ravel() % n))
+        return self
+
+    def chords_by_color(self):
+        """Returns the chords of each color as arrays of pin numbers, in the
+        order the colors were first used.
+        """
+        colors = {}
+        for color, a, b in self.chords:
+            colors.setdefault(color, []).append((a, b))
+        return {color: (np.concatenate([a for a, b in pairs]), np.concatenate([b for a, b in pairs]))
+                for color, pairs in colors.items()}
+
+    def draw(self):
+        self._drawn_points = []
+        shape = super().draw()
+        if self.chords:
+            # over the lines and under the pins
+            shape.children.insert(self._points_index(shape), self._draw_chords())
+        return shape
+
+    def _draw_point(self, index, x, y):
+        point = super()._draw_point(index, x, y)
+        self._drawn_points.append(point)
+        return point
+
+    def _points_index(self, shape):
+        """Returns the position in shape of the group with the pins drawn by
+        _draw_point.
+        """
+        pin = self._drawn_points[0]
+        for i, child in enumerate(shape.children):
+            if any(c is pin for c in getattr(child, "children", None) or []):
+                return i
+        raise ValueError("can't find the pins in the drawing of the pattern")
+
+    def _draw_chords(self):
+        pins = self.pins()
+        paths = [Shape("path", d=chords_path(pins, a, b), stroke=color)
+                 for color, (a, b) in self.chords_by_color().items()]
+        return Group(paths, stroke_width=self.stroke_width, stroke_linecap="round")
+
+def chords_path(pins, a, b, precision=PRECISION):
+    """Returns the path data that draws a line from pin a[k] to pin b[k] for
+    every k.
+    """
+    if len(a) == 0:
+        return ""
+    # adding 0.0 turns -0.0 into 0.0
+    xy = np.round(np.hstack([pins[a], pins[b]]), precision) + 0.0
+    return ("M%g %gL%g %g" * len(a)) % tuple(xy.ravel().tolist())
+
+def connect_many(a, b):
+    """Connects pin a[k] to pin b[k] for every k.
+
+    Usage:
+
+        make_circle(100)
+        i = np.arange(100)
+        connect_many(i, i + 30)
+    """
+    art = stringart._art
+    if not isinstance(art, Canvas):
+        raise TypeError("connect_many needs a chords.Canvas, build the pattern with build.py")
+    return art.connect_many(a, b)
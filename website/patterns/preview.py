@@ -0,0 +1,174 @@
+"""Draws raster previews of the patterns, as png or webp images.
+
+Usage:
+
+    python preview.py images/*.py [-d previews] [--size 1024] [--thumbnail 256 128] [--format webp]
+
+A pattern with tens of thousands of chords is slow to show as svg, as the
+browser draws every chord as a separate element. The preview is drawn
+with NumPy instead: every chord is sampled once per pixel along its
+length and the samples are spread over the two nearest pixels across it,
+which gives smooth edges. The thread on every pixel adds up, and the color
+is laid over the board as 1 - exp(-thread), so that the crossings get
+darker like real thread does.
+
+The thumbnails are scaled down from the full size image. Pillow is only
+needed to write the files.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from build import run
+from threadpath import chords_of
+
+# the size of the svg of a pattern, from -150 to 150
+VIEW_SIZE = 300
+
+# samples of all the chords in one go, to keep the memory bounded
+CHUNK_SAMPLES = 4_000_000
+
+def parse_color(color):
+    from PIL import ImageColor
+    return np.array(ImageColor.getrgb(color)[:3], dtype=np.float32) / 255
+
+def chord_samples(x0, y0, x1, y1, width, w):
+    """Yields the samples of the chords from (x0, y0) to (x1, y1), in pixels
+    of an image w pixels wide, in chunks.
+
+    The chords are sampled once per pixel along their longer side, with
+    the thread of each sample split between the two pixels nearest to it
+    on the other side. The chords must be inside the image, at least a
+    pixel away from its edges.
+
+    Every chunk is (chords, counts, index, weight): chord chords[k] has
+    the next 2*counts[k] entries of index and weight, which are the flat
+    pixel numbers and the thread on them.
+    """
+    x0, y0, x1, y1 = [np.asarray(v, dtype=np.float64) for v in (x0, y0, x1, y1)]
+    steep = np.abs(y1 - y0) > np.abs(x1 - x0)
+    # u is along the longer side of the chord and v across it, the steep
+    # and the other chords are drawn separately to keep the samples simple
+    for s, (u0, v0, u1, v1), stride in ((steep, (y0, x0, y1, x1), (w, 1)),
+                                         (~steep, (x0, y0, x1, y1), (1, w))):
+        chords = np.flatnonzero(s)
+        u0, v0, u1, v1 = u0[s], v0[s], u1[s], v1[s]
+        n = np.maximum(np.ceil(np.abs(u1 - u0)).astype(np.int64), 1)
+        du, dv = (u1 - u0) / n, (v1 - v0) / n
+        # the thread in each sample, which is longer for slanted chords
+        weight = (width * np.hypot(du, dv)).astype(np.float32)
+
+        start = 0
+        while start < len(n):
+            # as many chords as fit in a chunk of samples
+            end = start + max(1, int(np.searchsorted(np.cumsum(n[start:]), CHUNK_SAMPLES)))
+            counts = n[start:end]
+            offsets = np.repeat(np.cumsum(counts) - counts, counts)
+            k = (np.arange(offsets.size) - offsets).astype(np.float32) + 0.5
+
+            u = np.repeat((u0[start:end]).astype(np.float32), counts) + k * np.repeat(du[start:end].astype(np.float32), counts)
+            v = np.repeat((v0[start:end] - 0.5).astype(np.float32), counts) + k * np.repeat(dv[start:end].astype(np.float32), counts)
+            vi = np.floor(v)
+            frac = v - vi
+            index = u.astype(np.int64) * stride[0] + vi.astype(np.int64) * stride[1]
+            wt = np.repeat(weight[start:end], counts)
+            yield (chords[start:end], counts,
+                   np.stack([index, index + stride[1]], axis=1).reshape(-1),
+                   np.stack([wt * (1 - frac), wt * frac], axis=1).reshape(-1))
+            start = end
+
+def draw_chords(density, x0, y0, x1, y1, width):
+    """Adds the thread of the chords from (x0, y0) to (x1, y1), in pixels,
+    to density.
+    """
+    h, w = density.shape
+    flat = density.reshape(-1)
+    for chords, counts, index, weight in chord_samples(x0, y0, x1, y1, width, w):
+        flat += np.bincount(index, weights=weight, minlength=flat.size).astype(np.float32)
+
+def disc(size, cx, cy, r):
+    """Returns how much of every pixel is covered by the disc, with the
+    edge smoothed over a pixel.
+    """
+    y, x = np.ogrid[0:size, 0:size]
+    d = np.hypot(x + 0.5 - cx, y + 0.5 - cy)
+    return np.clip(r + 0.5 - d, 0, 1).astype(np.float32)
+
+def blend(image, color, alpha):
+    image[..., :3] = image[..., :3] * (1 - alpha[..., None]) + color * alpha[..., None]
+    image[..., 3] = image[..., 3] * (1 - alpha) + alpha
+
+def render_raster(art, size=1024, opacity=1.0):
+    """Draws the pattern on the canvas as an RGBA image of size x size
+    pixels and returns it as an array of bytes.
+    """
+    scale = size / VIEW_SIZE
+    image = np.zeros((size, size, 4), dtype=np.float32)
+    center = size / 2
+    blend(image, parse_color(art.BORDER_COLOR), disc(size, center, center, 148.5 * scale))
+    blend(image, parse_color(art.BACKGROUND_COLOR), disc(size, center, center, 147.5 * scale))
+
+    # svg has y growing downwards
+    points = np.asarray(art.points, dtype=float).reshape(-1, 2)
+    px = (points[:, 0] + VIEW_SIZE / 2) * scale
+    py = (VIEW_SIZE / 2 - points[:, 1]) * scale
+
+    for color, (a, b) in chords_of(art).items():
+        density = np.zeros((size, size), dtype=np.float32)
+        draw_chords(density, px[a], py[a], px[b], py[b], art.stroke_width * scale)
+        blend(image, parse_color(color), 1 - np.exp(-opacity * density))
+
+    # the pins, drawn only around each of them
+    pin_color = parse_color(art.POINT_COLOR)
+    for i, (x, y) in enumerate(zip(px, py)):
+        r = (3.2 if i == 0 else 2.4) * scale
+        x1, y1 = max(int(x - r - 1), 0), max(int(y - r - 1), 0)
+        x2, y2 = min(int(x + r + 2), size), min(int(y + r + 2), size)
+        yy, xx = np.mgrid[y1:y2, x1:x2] + 0.5
+        alpha = np.clip(r + 0.5 - np.hypot(xx - x, yy - y), 0, 1).astype(np.float32)
+        blend(image[y1:y2, x1:x2], pin_color, alpha)
+
+    return (np.clip(image, 0, 1) * 255 + 0.5).astype(np.uint8)
+
+def save_preview(art, path, size=1024, thumbnails=(), opacity=1.0):
+    """Writes the preview of the pattern to path, png or webp by its
+    extension, and the thumbnails next to it as name-<size>.<ext>.
+
+    Returns the paths written.
+    """
+    from PIL import Image
+
+    image = Image.fromarray(render_raster(art, size=size, opacity=opacity), "RGBA")
+    path = Path(path)
+    image.save(path)
+    paths = [path]
+    for thumbnail in thumbnails:
+        thumb_path = path.with_name(f"{path.stem}-{thumbnail}{path.suffix}")
+        image.resize((thumbnail, thumbnail), Image.LANCZOS).save(thumb_path)
+        paths.append(thumb_path)
+    return paths
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filenames", nargs="+")
+    p.add_argument("-d", "--output-dir", default="previews", help="directory to write the images to")
+    p.add_argument("--size", type=int, default=1024, help="width and height of the image in pixels")
+    p.add_argument("--thumbnail", type=int, nargs="*", default=[256], help="sizes of the thumbnails")
+    p.add_argument("--format", choices=["png", "webp"], default="png")
+    p.add_argument("--opacity", type=float, default=1.0, help="how dark a single thread is")
+    args = p.parse_args()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for filename in args.filenames:
+        start = time.perf_counter()
+        art = run(filename)
+        path = output_dir / f"{Path(filename).stem}.{args.format}"
+        save_preview(art, path, size=args.size, thumbnails=args.thumbnail, opacity=args.opacity)
+        print(f"{path}: {(time.perf_counter() - start)*1000:.0f}ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
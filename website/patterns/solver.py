@@ -0,0 +1,230 @@
+"""Makes a string art pattern out of a picture.
+
+Usage:
+
+    python solver.py portrait.jpg [-o images/portrait.py] [--pins 300] [--chords 4000] [-j 4]
+
+The pins are laid out like make_circle(n) does and a single dark thread is
+wound from pin to pin. At every step the thread goes to the pin whose chord
+takes away the most of the error between the picture and the thread drawn
+so far, which is the greedy method most string art portraits are made with.
+
+The pixels under every chord are found once, before the first step, with
+the same sampling the previews are drawn with, so that a step only has to
+add up the error on the pixels under the chords from the current pin. The
+chord that is picked is then taken off the residual, the darkness that is
+still missing, on its own pixels. The chords from the current pin can be
+scored in parallel with -j, in threads, as NumPy lets go of the GIL while
+it gathers and adds up the pixels.
+
+Writes the pattern as a script of connect calls that build.py can draw,
+and the winding order next to it, as a .txt file in the format of
+threadpath.py --sequence.
+"""
+import argparse
+import sys
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from chords import Canvas
+from preview import chord_samples
+from threadpath import Winding
+
+# the color of the thread in the script
+THREAD_COLOR = "#222222"
+
+class Chords:
+    """The pixels under every chord between n pins on a circle, in an image
+    of size x size pixels.
+
+    The entries of chord c are index[start[c]:start[c]+count[c]], the flat
+    pixel numbers, with the thread on them in weight. A pixel has a single
+    entry in a chord, with the thread of all the samples on it. number[a, b]
+    is the chord between pins a and b.
+    """
+    def __init__(self, n, size):
+        self.n = n
+        self.size = size
+
+        pins = Canvas().make_circle(n).pins()
+        # the circle of pins fills the image, a pixel away from its edges
+        scale = (size / 2 - 1) / Canvas.RADIUS
+        self.x = size / 2 + pins[:, 0] * scale
+        self.y = size / 2 - pins[:, 1] * scale
+
+        a, b = np.triu_indices(n, k=1)
+        self.number = np.full((n, n), -1, dtype=np.int64)
+        self.number[a, b] = self.number[b, a] = np.arange(len(a))
+
+        self.start = np.zeros(len(a), dtype=np.int64)
+        self.count = np.zeros(len(a), dtype=np.int64)
+        index, weight = [], []
+        offset = 0
+        for chords, counts, idx, wt in chord_samples(self.x[a], self.y[a], self.x[b], self.y[b], 1.0, size):
+            counts, idx, wt = merge_entries(2 * counts, idx, wt)
+            self.count[chords] = counts
+            self.start[chords] = offset + np.cumsum(counts) - counts
+            offset += len(idx)
+            index.append(idx.astype(np.int32))
+            weight.append(wt)
+        self.index = np.concatenate(index)
+        self.weight = np.concatenate(weight)
+
+    def entries(self, chords):
+        """Returns the positions in index and weight of the entries of the
+        chords, one after another.
+        """
+        count = self.count[chords]
+        ends = np.cumsum(count)
+        return np.arange(ends[-1]) + np.repeat(self.start[chords] - (ends - count), count)
+
+    def score(self, residual, chords, thread):
+        """Returns how much drawing each chord takes off the squared error,
+        with thread as the darkness of a pixel under a whole thread.
+        """
+        positions = self.entries(chords)
+        w = self.weight[positions] * thread
+        gain = w * (2 * residual[self.index[positions]] - w)
+        return np.add.reduceat(gain, np.cumsum(self.count[chords]) - self.count[chords])
+
+    def draw(self, residual, c, thread):
+        """Takes the thread of chord c off the residual.
+        """
+        positions = np.arange(self.start[c], self.start[c] + self.count[c])
+        # a pixel has a single entry in a chord, so none is left out
+        residual[self.index[positions]] -= self.weight[positions] * thread
+
+def merge_entries(counts, index, weight):
+    """Adds up the entries of a chord that are on the same pixel.
+
+    The chords have the next counts[k] entries of index and weight, one
+    after another, as chord_samples yields them. Two samples of a chord
+    can put thread on the same pixel. Returns the counts, index and weight
+    of the chords with a single entry for each of their pixels.
+    """
+    chord = np.repeat(np.arange(len(counts)), counts)
+    key = chord * (int(index.max()) + 1) + index
+    # the keys are nearly in order already, which a stable sort is quick at
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    first = np.ones(len(key), dtype=bool)
+    first[1:] = key[1:] != key[:-1]
+    merged = np.bincount(np.cumsum(first) - 1, weights=weight[order]).astype(weight.dtype)
+    return np.bincount(chord[order][first], minlength=len(counts)), index[order][first], merged
+
+def load_image(path, size):
+    """Returns the darkness of the picture at path, from 0 for white to 1
+    for black, cropped to a square and scaled to size x size pixels.
+    """
+    from PIL import Image, ImageOps
+
+    image = ImageOps.fit(Image.open(path).convert("L"), (size, size), Image.LANCZOS)
+    return 1 - np.asarray(image, dtype=np.float32) / 255
+
+def solve(darkness, num_pins=300, num_chords=4000, thread=0.04, min_gap=10, jobs=1, chords=None):
+    """Returns the sequence of pins to wind the thread through to draw the
+    darkness, a square array, on num_pins pins.
+
+    Stops early when no chord makes the error any smaller. Chords between
+    pins less than min_gap apart around the circle are skipped, as they
+    only touch the edge of the picture, and so are the chords that are
+    already drawn.
+    """
+    size = darkness.shape[0]
+    if chords is None:
+        chords = Chords(num_pins, size)
+    residual = np.ascontiguousarray(darkness, dtype=np.float32).reshape(-1).copy()
+
+    pins = np.arange(num_pins)
+    gap = np.abs(pins[:, None] - pins[None, :])
+    allowed = np.minimum(gap, num_pins - gap) >= min_gap
+    used = np.zeros(len(chords.start), dtype=bool)
+
+    pool = ThreadPoolExecutor(jobs) if jobs > 1 else None
+
+    def score(candidates):
+        numbers = chords.number[pin, candidates]
+        if pool is None:
+            return chords.score(residual, numbers, thread)
+        parts = np.array_split(numbers, jobs)
+        return np.concatenate(list(pool.map(lambda part: chords.score(residual, part, thread), parts)))
+
+    pin = 0
+    sequence = [pin]
+    try:
+        for _ in range(num_chords):
+            candidates = np.flatnonzero(allowed[pin] & ~used[chords.number[pin]])
+            if len(candidates) == 0:
+                break
+            scores = score(candidates)
+            best = int(np.argmax(scores))
+            if scores[best] <= 0:
+                break
+            next_pin = int(candidates[best])
+            c = chords.number[pin, next_pin]
+            used[c] = True
+            chords.draw(residual, c, thread)
+            pin = next_pin
+            sequence.append(pin)
+    finally:
+        if pool:
+            pool.shutdown()
+    return sequence
+
+def make_script(sequence, num_pins, source=""):
+    """Returns a pattern script that connects the pins in the sequence.
+    """
+    numbers = textwrap.fill(", ".join(str(pin) for pin in sequence), width=76,
+                            initial_indent="    ", subsequent_indent="    ")
+    return (f"# made by solver.py from {source}, {len(sequence) - 1} chords\n"
+            "from stringart import *\n"
+            "\n"
+            f"n = {num_pins}\n"
+            "sequence = [\n"
+            f"{numbers}\n"
+            "]\n"
+            "\n"
+            "make_circle(n)\n"
+            f"set_color('{THREAD_COLOR}')\n"
+            "for a, b in zip(sequence, sequence[1:]):\n"
+            "    connect(a, b)\n")
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filename", help="the picture")
+    p.add_argument("-o", "--output", help="the pattern script to write, images/<name>.py by default")
+    p.add_argument("--pins", type=int, default=300, help="number of pins")
+    p.add_argument("--chords", type=int, default=4000, help="most chords to draw")
+    p.add_argument("--size", type=int, default=300, help="width and height in pixels to match the picture at")
+    p.add_argument("--thread", type=float, default=0.04, help="how dark a pixel under a thread gets, from 0 to 1")
+    p.add_argument("--min-gap", type=int, default=10, help="fewest pins between the ends of a chord")
+    p.add_argument("-j", "--jobs", type=int, default=1, help="threads to score the chords with")
+    p.add_argument("--radius", type=float, default=100, help="radius of the circle of pins in mm, for the thread length")
+    args = p.parse_args()
+
+    output = Path(args.output or f"images/{Path(args.filename).stem}.py")
+    darkness = load_image(args.filename, args.size)
+
+    start = time.perf_counter()
+    chords = Chords(args.pins, args.size)
+    prepared = time.perf_counter()
+    sequence = solve(darkness, num_pins=args.pins, num_chords=args.chords, thread=args.thread,
+                     min_gap=args.min_gap, jobs=args.jobs, chords=chords)
+    solved = time.perf_counter()
+
+    output.write_text(make_script(sequence, args.pins, source=Path(args.filename).name))
+    winding = Winding(sequence, np.zeros(len(sequence) - 1, dtype=bool))
+    output.with_suffix(".txt").write_text(winding.format() + "\n")
+
+    positions = Canvas().make_circle(args.pins).pins() * (args.radius / Canvas.RADIUS)
+    front, _ = winding.lengths(positions)
+    print(f"{output}: {len(sequence) - 1} chords, {front/1000:.1f} m of thread", file=sys.stderr)
+    print(f"prepared the chords in {(prepared - start)*1000:.0f}ms, "
+          f"solved in {(solved - prepared)*1000:.0f}ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
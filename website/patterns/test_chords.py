@@ -0,0 +1,66 @@
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from chords import PRECISION, Canvas, chords_path
+
+N = 50
+
+STEPS = [("red", 7), ("blue", 19), ("red", 25)]
+
+def segments_of_lines(svg):
+    """The <line> elements of the svg by color, as rounded coordinates.
+    """
+    found = {}
+    for elem in ET.fromstring(svg).iter():
+        if elem.tag.endswith("line"):
+            xy = [float(elem.get(k)) for k in ("x1", "y1", "x2", "y2")]
+            found.setdefault(elem.get("stroke"), []).append(tuple(round(v, PRECISION) + 0.0 for v in xy))
+    return found
+
+def segments_of_paths(svg):
+    """The segments drawn by the <path> elements of the svg by color.
+    """
+    found = {}
+    for elem in ET.fromstring(svg).iter():
+        if elem.tag.endswith("path"):
+            for segment in re.findall(r"M([-.\d]+) ([-.\d]+)L([-.\d]+) ([-.\d]+)", elem.get("d")):
+                found.setdefault(elem.get("stroke"), []).append(tuple(float(v) for v in segment))
+    return found
+
+def test_chords_path_matches_connect():
+    lines = Canvas()
+    lines.make_circle(N)
+    chords = Canvas()
+    chords.make_circle(N)
+    i = np.arange(N)
+    for color, step in STEPS:
+        lines.set_color(color)
+        for k in range(N):
+            lines.connect(k, k + step)
+        chords.set_color(color)
+        chords.connect_many(i, i + step)
+
+    expected = segments_of_lines(lines.as_svg())
+    assert segments_of_paths(chords.as_svg()) == expected
+    assert [len(segments) for segments in expected.values()] == [2*N, N]
+
+def test_chords_are_drawn_under_the_pins():
+    art = Canvas()
+    art.make_circle(N)
+    art.connect(0, 10)
+    art.connect_many(np.arange(N), np.arange(N) + 3)
+    tags = [elem.tag.rsplit("}", 1)[-1] for elem in ET.fromstring(art.as_svg()).iter()]
+    first_pin = tags.index("circle", tags.index("path"))
+    assert tags.index("line") < tags.index("path") < first_pin
+
+def test_chords_path_rounds_without_negative_zero():
+    pins = np.array([[0.0, -1e-9], [1.23456, -2.0]])
+    assert chords_path(pins, np.array([0]), np.array([1])) == "M0 0L1.23 -2"
+    assert chords_path(pins, np.array([], dtype=int), np.array([], dtype=int)) == ""
+
+def test_connect_many_needs_the_pins():
+    with pytest.raises(ValueError):
+        Canvas().connect_many([0], [1])
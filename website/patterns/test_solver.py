@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from preview import draw_chords
+from solver import Chords, solve
+
+N, SIZE, THREAD = 40, 60, 0.3
+
+@pytest.fixture(scope="module")
+def chords():
+    return Chords(N, SIZE)
+
+@pytest.fixture
+def darkness():
+    return np.random.default_rng(1).random((SIZE, SIZE), dtype=np.float32)
+
+def dense(chords, a, b):
+    """The thread of the chord from pin a to pin b, drawn on a whole image.
+    """
+    density = np.zeros((SIZE, SIZE), dtype=np.float32)
+    draw_chords(density, chords.x[a], chords.y[a], chords.x[b], chords.y[b], 1.0)
+    return density.reshape(-1)
+
+def test_chords_have_every_pixel_once(chords):
+    for c in range(len(chords.start)):
+        pixels = chords.index[chords.start[c]:chords.start[c] + chords.count[c]]
+        assert len(np.unique(pixels)) == len(pixels)
+
+def test_score_matches_dense(chords, darkness):
+    residual = darkness.reshape(-1)
+    b = np.arange(1, N)
+    scores = chords.score(residual, chords.number[0, b], THREAD)
+    expected = [np.sum(residual**2) - np.sum((residual - THREAD * dense(chords, 0, pin))**2) for pin in b]
+    np.testing.assert_allclose(scores, expected, rtol=1e-4, atol=1e-4)
+
+def test_residual_after_one_step(chords, darkness):
+    sequence = solve(darkness, num_pins=N, num_chords=1, thread=THREAD, min_gap=1, chords=chords)
+    assert len(sequence) == 2
+    a, b = sequence
+
+    # the greedy step picks the chord that takes the most off the error
+    residual = darkness.reshape(-1)
+    gains = [np.sum(residual**2) - np.sum((residual - THREAD * dense(chords, a, pin))**2) for pin in range(1, N)]
+    assert b == 1 + int(np.argmax(gains))
+
+    residual = darkness.reshape(-1).copy()
+    chords.draw(residual, chords.number[a, b], THREAD)
+    np.testing.assert_allclose(residual, darkness.reshape(-1) - THREAD * dense(chords, a, b), atol=1e-5)
@@ -0,0 +1,75 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from chords import Canvas
+from threadpath import components, plan, plan_pattern
+
+N = 60
+
+def circle(n):
+    t = 2 * np.pi * np.arange(n) / n
+    return np.stack([np.cos(t), np.sin(t)], axis=1)
+
+def pairs(a, b):
+    return Counter(tuple(sorted(pair)) for pair in zip(a.tolist(), b.tolist()))
+
+def check_winding(a, b, winding):
+    """Checks that the winding goes along every chord exactly once, and
+    returns the number of back runs.
+    """
+    pins, back = winding.pins, winding.back
+    assert len(back) == max(len(pins) - 1, 0)
+    front = ~back
+    assert pairs(pins[:-1][front], pins[1:][front]) == pairs(a[a != b], b[a != b])
+    return int(back.sum())
+
+def groups(a, b):
+    group = components(N, a, b)
+    return len({group[pin] for pin in np.concatenate([a, b]).tolist()})
+
+@pytest.mark.parametrize("seed", range(5))
+def test_every_chord_once(seed):
+    rng = np.random.default_rng(seed)
+    a, b = rng.integers(0, N, 300), rng.integers(0, N, 300)
+    winding = plan(a, b, circle(N))
+    back = check_winding(a, b, winding)
+    odd = np.count_nonzero((np.bincount(a, minlength=N) + np.bincount(b, minlength=N)) % 2)
+    assert back <= max(odd // 2 - 1, 0) + groups(a, b) - 1
+
+def test_closed_path_has_no_back_runs():
+    i = np.arange(N)
+    a, b = i, (i + 7) % N
+    assert check_winding(a, b, plan(a, b, circle(N))) == 0
+
+def test_groups_without_shared_pins():
+    # two triangles and a repeated chord, far apart
+    a = np.array([0, 1, 2, 30, 31, 32, 45, 45])
+    b = np.array([1, 2, 0, 31, 32, 30, 50, 50])
+    assert check_winding(a, b, plan(a, b, circle(N))) == 2
+
+def test_chords_from_a_pin_to_itself_are_left_out():
+    a, b = np.array([3, 5, 5]), np.array([4, 5, 5])
+    winding = plan(a, b, circle(N))
+    assert check_winding(a, b, winding) == 0
+    assert sorted(winding.pins.tolist()) == [3, 4]
+    empty = plan(np.array([5]), np.array([5]), circle(N))
+    assert len(empty.pins) == 0
+
+def test_plan_pattern_winds_lines_and_chords():
+    art = Canvas()
+    art.make_circle(N)
+    art.set_color("red")
+    art.connect(0, 20)
+    art.connect(20, 40)
+    i = np.arange(N)
+    art.connect_many(i, i + 11)
+    art.set_color("blue")
+    art.connect_many(i, i + 30)
+    windings = plan_pattern(art)
+    assert list(windings) == ["red", "blue"]
+
+    red = np.concatenate([[0, 20], i]), np.concatenate([[20, 40], (i + 11) % N])
+    check_winding(*red, windings["red"])
+    check_winding(i, (i + 30) % N, windings["blue"])
@@ -0,0 +1,218 @@
+"""Plans the winding of the thread of a pattern and how much thread it needs.
+
+Usage:
+
+    python threadpath.py images/*.py [--radius 100] [--sequence]
+
+The chords of each color are wound with one continuous thread, going from
+pin to pin. That is an Eulerian path through the chords, which only exists
+when at most two pins have an odd number of chords. Otherwise the thread
+has to run along the back of the board from one pin to another, so the odd
+pins are paired up, in the order they are around the circle, with the
+shortest runs. The same is done to join the groups of chords that don't
+share any pins.
+
+Prints the number of chords, the back runs and the length of the thread
+in mm, for pins on a circle with the given radius in mm. With --sequence,
+also prints the pins in the order they are wound, with a ~ before the
+pins that are reached along the back.
+"""
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from build import run
+
+class Winding:
+    """The order to wind the chords of one color in.
+
+    pins is the sequence of pin numbers the thread goes through and back
+    tells, for every step from one pin to the next, if it runs along the
+    back of the board.
+    """
+    def __init__(self, pins, back):
+        self.pins = np.asarray(pins, dtype=np.int64)
+        self.back = np.asarray(back, dtype=bool)
+
+    def lengths(self, positions):
+        """Returns the length of the thread on the front and on the back.
+        """
+        p = positions[self.pins]
+        steps = np.hypot(*(p[1:] - p[:-1]).T) if len(p) > 1 else np.zeros(0)
+        return steps[~self.back].sum(), steps[self.back].sum()
+
+    def format(self):
+        return " ".join(("~" if back else "") + str(pin)
+                        for pin, back in zip(self.pins.tolist(), [False] + self.back.tolist()))
+
+def chords_of(art):
+    """Returns the chords of every color on the canvas, as arrays of pin
+    numbers, in the order the colors were first used.
+    """
+    index = {tuple(p): i for i, p in enumerate(art.points)}
+    colors = {}
+    for p1, p2, color in art.lines:
+        colors.setdefault(color, ([], []))
+        colors[color][0].append(index[tuple(p1)])
+        colors[color][1].append(index[tuple(p2)])
+    colors = {color: (np.array(a, dtype=np.int64), np.array(b, dtype=np.int64)) for color, (a, b) in colors.items()}
+    for color, (a, b) in getattr(art, "chords_by_color", dict)().items():
+        if color in colors:
+            colors[color] = (np.concatenate([colors[color][0], a]), np.concatenate([colors[color][1], b]))
+        else:
+            colors[color] = (a, b)
+    return colors
+
+def pair_odd_pins(odd, positions):
+    """Pairs up the pins with an odd number of chords, leaving out the
+    pair that is most costly to join, and returns the pairs.
+
+    The pins are on a circle, so each one is paired with its neighbour in
+    one of the two ways to go around.
+    """
+    if len(odd) <= 2:
+        return []
+    best = None
+    for offset in (0, 1):
+        order = np.roll(odd, -offset)
+        a, b = order[0::2], order[1::2]
+        cost = np.hypot(*(positions[a] - positions[b]).T)
+        # the most costly pair becomes the start and the end of the thread
+        drop = int(np.argmax(cost))
+        total = cost.sum() - cost[drop]
+        if best is None or total < best[0]:
+            best = (total, np.delete(a, drop), np.delete(b, drop))
+    return list(zip(best[1].tolist(), best[2].tolist()))
+
+def components(num_pins, a, b):
+    """Returns the group number of every pin, with the pins connected by
+    the edges a-b in the same group.
+    """
+    parent = list(range(num_pins))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for x, y in zip(a.tolist(), b.tolist()):
+        rx, ry = find(x), find(y)
+        if rx != ry:
+            parent[rx] = ry
+    return [find(x) for x in range(num_pins)]
+
+def euler_path(start, a, b, adjacency):
+    """Returns the pins and the edges of a path that goes through every
+    edge reachable from start once, using Hierholzer's algorithm.
+
+    adjacency has the (other pin, edge) pairs of every pin.
+    """
+    used = bytearray(len(a))
+    position = [0] * len(adjacency)
+    stack = [(start, -1)]
+    pins, edges = [], []
+    while stack:
+        v, e = stack[-1]
+        edges_of_v = adjacency[v]
+        k = position[v]
+        while k < len(edges_of_v) and used[edges_of_v[k][1]]:
+            k += 1
+        position[v] = k
+        if k < len(edges_of_v):
+            w, f = edges_of_v[k]
+            used[f] = 1
+            stack.append((w, f))
+        else:
+            stack.pop()
+            pins.append(v)
+            edges.append(e)
+    pins.reverse()
+    edges.reverse()
+    return pins, edges[1:]
+
+def plan(a, b, positions):
+    """Returns the Winding of the chords from pin a[k] to pin b[k], with as
+    little thread on the back as this method finds.
+    """
+    num_pins = len(positions)
+    keep = a != b
+    a, b = a[keep], b[keep]
+    if len(a) == 0:
+        return Winding([], [])
+
+    degree = np.bincount(a, minlength=num_pins) + np.bincount(b, minlength=num_pins)
+    odd = np.flatnonzero(degree % 2)
+    pairs = pair_odd_pins(odd, positions)
+    front = len(a)
+    if pairs:
+        extra = np.array(pairs, dtype=np.int64)
+        a, b = np.concatenate([a, extra[:, 0]]), np.concatenate([b, extra[:, 1]])
+
+    adjacency = [[] for _ in range(num_pins)]
+    for e, (x, y) in enumerate(zip(a.tolist(), b.tolist())):
+        adjacency[x].append((y, e))
+        adjacency[y].append((x, e))
+
+    # every group of connected pins is wound in one go, starting with the
+    # one that has the two odd pins left, if any
+    group = components(num_pins, a, b)
+    degree = np.bincount(a, minlength=num_pins) + np.bincount(b, minlength=num_pins)
+    starts = {}
+    for pin in np.flatnonzero(degree).tolist():
+        if group[pin] not in starts or degree[pin] % 2:
+            starts[group[pin]] = pin
+    todo = sorted(starts.values(), key=lambda pin: degree[pin] % 2 == 0)
+
+    pins, back = [], []
+    while todo:
+        if pins:
+            # go to the nearest group that is left, along the back
+            here = positions[pins[-1]]
+            nearest = min(range(len(todo)), key=lambda k: math.dist(here, positions[todo[k]]))
+            start = todo.pop(nearest)
+            # a closed path can start from any of its pins
+            candidates = [pin for pin in range(num_pins) if group[pin] == group[start] and degree[pin]]
+            if degree[start] % 2 == 0:
+                start = min(candidates, key=lambda pin: math.dist(here, positions[pin]))
+            back.append(True)
+        else:
+            start = todo.pop(0)
+        path, edges = euler_path(start, a, b, adjacency)
+        pins += path
+        back += [e >= front for e in edges]
+    return Winding(pins, back)
+
+def plan_pattern(art):
+    """Returns the Winding of every color of the pattern on the canvas.
+    """
+    positions = np.asarray(art.points, dtype=float).reshape(-1, 2)
+    return {color: plan(a, b, positions) for color, (a, b) in chords_of(art).items()}
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("filenames", nargs="+")
+    p.add_argument("--radius", type=float, default=100, help="radius of the circle of pins, in mm")
+    p.add_argument("--sequence", action="store_true", help="print the order to wind the pins in")
+    args = p.parse_args()
+
+    print(f"{'pattern':28s} {'color':10s} {'chords':>7s} {'back':>6s} {'front mm':>10s} {'back mm':>9s} {'total m':>8s}")
+    for filename in args.filenames:
+        art = run(filename)
+        start = time.perf_counter()
+        windings = plan_pattern(art)
+        seconds = time.perf_counter() - start
+        positions = np.asarray(art.points, dtype=float).reshape(-1, 2) * (args.radius / art.RADIUS)
+        for color, winding in windings.items():
+            front, back = winding.lengths(positions)
+            print(f"{filename:28s} {color:10s} {len(winding.back) - winding.back.sum():7d} {winding.back.sum():6d} "
+                  f"{front:10.0f} {back:9.0f} {(front + back)/1000:8.2f}")
+            if args.sequence:
+                print(winding.format())
+        print(f"planned {filename} in {seconds*1000:.0f}ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()